@@ -13,7 +13,7 @@ import sys
 import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
-from bigupload_fastapi import create_upload_router
+from bigupload_fastapi import create_upload_router, SQLiteMetadataStore
 
 def create_app():
     """创建FastAPI应用"""
@@ -23,25 +23,39 @@ def create_app():
         version="1.0.0"
     )
 
-    # 配置CORS
-    app.add_middleware(
-        CORSMiddleware,
-        allow_origins=["*"],  # 生产环境中应该限制具体域名
-        allow_credentials=True,
-        allow_methods=["*"],
-        allow_headers=["*"],
-    )
+    # 配置CORS：仅在前端与后端跨域部署时启用（ENABLE_CORS=1），同源部署无需经过 CORS 中间件
+    if os.environ.get("ENABLE_CORS"):
+        app.add_middleware(
+            CORSMiddleware,
+            allow_origins=os.environ.get("ALLOWED_ORIGINS", "http://localhost:3001").split(","),
+            allow_credentials=True,
+            allow_methods=["GET", "POST", "PUT"],
+            allow_headers=[
+                "Content-Type",
+                "X-Chunk-Total",
+                "X-File-Hash",
+                "X-File-Name",
+                "X-Chunk-Hash",
+                "X-File-Size",
+                "X-Chunk-Size",
+                "X-Hash-Algorithm",
+            ],
+            max_age=86400,  # 浏览器缓存预检结果，减少分片上传过程中的 OPTIONS 请求
+        )
 
     # 创建并挂载上传路由
     upload_router = create_upload_router(
         upload_path="./uploads",
-        temp_path="./uploads/temp",
+        # 临时分片与元数据库放在文件服务目录之外，不能通过 /files 访问
+        temp_path="./data/temp",
         base_url="http://localhost:5000",
         max_file_size=0,  # 0表示不限制文件大小
         chunk_size=2 * 1024 * 1024,  # 2MB分片大小
         concurrent=3,
         enable_file_server=True,
-        file_server_path="/files"
+        file_server_path="/files",
+        # 元数据保存在 SQLite 中，多个 worker 进程共享上传状态
+        metadata_store=SQLiteMetadataStore("./data/metadata.db")
     )
 
     app.include_router(upload_router, prefix="/api/upload")
@@ -57,6 +71,7 @@ def create_app():
                 "health": "/api/upload/health",
                 "verify": "POST /api/upload/verify",
                 "upload": "POST /api/upload/upload", 
+                "upload_raw": "PUT /api/upload/upload/{file_id}/{chunk_index}",
                 "merge": "POST /api/upload/merge",
                 "status": "GET /api/upload/status/{file_id}",
                 "list": "GET /api/upload/list",
@@ -88,16 +103,25 @@ if __name__ == "__main__":
     print("上传接口:")
     print("  POST /api/upload/verify   - 验证文件（秒传/断点续传）")
     print("  POST /api/upload/upload   - 上传分片")
+    print("  PUT  /api/upload/upload/{file_id}/{chunk_index} - 上传分片（原始请求体）")
     print("  POST /api/upload/merge    - 合并分片")
     print("  GET  /api/upload/status/{file_id} - 查询上传状态")
     print("  GET  /api/upload/list     - 列出正在上传的文件")
     print("  GET  /files/{filename}    - 下载文件")
     print("=" * 60)
     
+    # BIGUPLOAD_DEV=1 时单进程热重载；否则按 CPU 核数启动多个 worker（元数据已保存在共享的 SQLite 中）
+    dev = os.environ.get("BIGUPLOAD_DEV") == "1"
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
-        port=5000,
-        reload=True,
-        log_level="info"
+        port=int(os.environ.get("PORT", 5000)),
+        reload=dev,
+        workers=1 if dev else int(os.environ.get("WORKERS", os.cpu_count() or 1)),
+        loop="auto",  # 安装了 uvloop 时自动使用
+        http="httptools",
+        log_level="info" if dev else "warning",
+        limit_concurrency=1000,
+        timeout_keep_alive=30,
+        backlog=2048
     ) 
\ No newline at end of file
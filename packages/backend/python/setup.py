@@ -1,6 +1,13 @@
 from setuptools import setup, find_packages
 import os
 
+# 设置 BIGUPLOAD_MYPYC=1 时使用 mypyc 将元数据类型 (metadata.py) 编译为 C 扩展，需先安装 mypy；
+# 默认仍为纯 Python 包
+ext_modules = []
+if os.environ.get("BIGUPLOAD_MYPYC") == "1":
+    from mypyc.build import mypycify
+    ext_modules = mypycify(["--follow-imports=silent", "src/bigupload_fastapi/metadata.py"])
+
 setup(
     name="bigupload-fastapi",
     version="1.0.0",
@@ -12,6 +19,7 @@ setup(
     url="https://github.com/bigupload/bigupload-fastapi",
     packages=find_packages(where="src"),
     package_dir={"": "src"},
+    ext_modules=ext_modules,
     classifiers=[
         "Development Status :: 4 - Beta",
         "Intended Audience :: Developers",
@@ -28,14 +36,23 @@ setup(
     install_requires=[
         "fastapi>=0.68.0",
         "python-multipart>=0.0.5",
-        "aiofiles>=0.7.0",
+        "anyio>=3.0.0",
+        "orjson>=3.0.0",
         "pydantic>=1.8.0",
     ],
     extras_require={
+        "blake3": [
+            "blake3>=0.4.0",
+        ],
+        "redis": [
+            "redis>=4.2.0",
+        ],
         "dev": [
             "uvicorn[standard]>=0.15.0",
             "pytest>=6.0",
             "pytest-asyncio>=0.15.0",
+            "httpx>=0.23.0",
+            "fakeredis[lua]>=2.10.0",
         ],
     },
     keywords="upload, fastapi, chunk-upload, large-file, async",
@@ -30,6 +30,7 @@ app.include_router(upload_router, prefix="/api/upload")
 from .router import create_upload_router
 from .models import VerifyRequest, VerifyResponse, UploadResponse, MergeRequest, MergeResponse
 from .config import UploadConfig
+from .store import MetadataStore, MemoryMetadataStore, LogMetadataStore, SQLiteMetadataStore, RedisMetadataStore
 
 __version__ = "1.0.0"
 __author__ = "BigUpload Team"
@@ -42,4 +43,9 @@ __all__ = [
     "MergeRequest",
     "MergeResponse",
     "UploadConfig",
+    "MetadataStore",
+    "MemoryMetadataStore",
+    "LogMetadataStore",
+    "SQLiteMetadataStore",
+    "RedisMetadataStore",
 ] 
\ No newline at end of file
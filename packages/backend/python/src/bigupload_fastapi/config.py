@@ -3,13 +3,31 @@ Configuration class for BigUpload FastAPI package
 """
 
 import os
-from pathlib import Path
 from typing import Optional
+import anyio
+
+from .hashing import check_hash_algorithm, check_hash_mode
 
 
 class UploadConfig:
     """上传配置类"""
     
+    __slots__ = (
+        "upload_path",
+        "temp_path",
+        "base_url",
+        "max_file_size",
+        "max_direct_file_size",
+        "chunk_size",
+        "concurrent",
+        "enable_file_server",
+        "file_server_path",
+        "hash_algorithm",
+        "hash_mode",
+        "_upload_dir",
+        "_temp_dir",
+    )
+    
     def __init__(
         self,
         upload_path: str = "./uploads",
@@ -19,7 +37,10 @@ class UploadConfig:
         chunk_size: int = 2 * 1024 * 1024,  # 2MB
         concurrent: int = 3,
         enable_file_server: bool = True,
-        file_server_path: str = "/files"
+        file_server_path: str = "/files",
+        hash_algorithm: str = "sha256",
+        hash_mode: str = "full",
+        max_direct_file_size: int = 64 * 1024 * 1024 * 1024  # 64GB
     ):
         """
         初始化上传配置
@@ -33,23 +54,37 @@ class UploadConfig:
             concurrent: 并发上传数量
             enable_file_server: 是否启用文件服务
             file_server_path: 文件服务路径
+            hash_algorithm: 文件/分片哈希算法，sha256 或 blake3（需安装 blake3 可选依赖）
+            hash_mode: 合并请求未指定 hashMode 时使用的文件哈希模式，full 或 merkle；
+                为 merkle 时每个分片上传时都计算并保存摘要，合并时无需再读取分片数据
+            max_direct_file_size: 直接写入模式下预分配文件的大小上限（字节），max_file_size 为 0 时生效；
+                预分配按客户端声明的 fileSize 占用磁盘，需要有上限
         """
         self.upload_path = upload_path
         self.temp_path = temp_path or os.path.join(upload_path, "temp")
         self.base_url = base_url.rstrip("/")
         self.max_file_size = max_file_size
+        self.max_direct_file_size = max_direct_file_size
         self.chunk_size = chunk_size
         self.concurrent = concurrent
         self.enable_file_server = enable_file_server
         self.file_server_path = file_server_path
-        
-        # 确保目录存在
-        self._ensure_directories()
+        check_hash_algorithm(hash_algorithm)
+        self.hash_algorithm = hash_algorithm
+        check_hash_mode(hash_mode)
+        self.hash_mode = hash_mode
+        # 预先计算目录前缀，热路径上直接拼接字符串，避免逐次调用 os.path.join
+        self._upload_dir = os.path.join(self.upload_path, "")
+        self._temp_dir = os.path.join(self.temp_path, "")
     
-    def _ensure_directories(self):
-        """确保上传和临时目录存在"""
-        Path(self.upload_path).mkdir(parents=True, exist_ok=True)
-        Path(self.temp_path).mkdir(parents=True, exist_ok=True)
+    async def init(self):
+        """
+        异步初始化：确保上传和临时目录存在
+        
+        由 create_upload_router 注册为应用启动事件，使用 anyio.Path 不阻塞事件循环
+        """
+        await anyio.Path(self.upload_path).mkdir(parents=True, exist_ok=True)
+        await anyio.Path(self.temp_path).mkdir(parents=True, exist_ok=True)
     
     def get_file_url(self, filename: str) -> str:
         """生成文件访问URL"""
@@ -57,15 +92,27 @@ class UploadConfig:
     
     def get_upload_file_path(self, filename: str) -> str:
         """获取上传文件的完整路径"""
-        return os.path.join(self.upload_path, filename)
+        return self._upload_dir + filename
     
     def get_temp_dir_path(self, file_id: str) -> str:
         """获取临时目录路径"""
-        return os.path.join(self.temp_path, file_id)
+        return self._temp_dir + file_id
+    
+    def get_chunk_path_prefix(self, file_id: str) -> str:
+        """
+        获取分片文件路径前缀，分片路径为 prefix + str(chunk_index)
+        
+        遍历大量分片时先取前缀再拼接索引，避免每个分片都调用 os.path.join
+        """
+        return self._temp_dir + file_id + os.sep
     
     def get_chunk_file_path(self, file_id: str, chunk_index: int) -> str:
         """获取分片文件路径"""
-        return os.path.join(self.get_temp_dir_path(file_id), str(chunk_index))
+        return f"{self._temp_dir}{file_id}{os.sep}{chunk_index}"
+    
+    def get_partial_file_path(self, file_id: str) -> str:
+        """获取直接写入模式下预分配的未完成文件路径"""
+        return f"{self._upload_dir}.{file_id}.partial"
     
     def __repr__(self):
         return (
@@ -75,5 +122,7 @@ class UploadConfig:
             f"base_url='{self.base_url}', "
             f"max_file_size={self.max_file_size}, "
             f"chunk_size={self.chunk_size}, "
-            f"concurrent={self.concurrent})"
+            f"concurrent={self.concurrent}, "
+            f"hash_algorithm='{self.hash_algorithm}', "
+            f"hash_mode='{self.hash_mode}')"
         ) 
\ No newline at end of file
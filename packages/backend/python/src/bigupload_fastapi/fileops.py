@@ -0,0 +1,200 @@
+"""
+File copy helpers for BigUpload FastAPI package
+"""
+
+import errno
+import mmap
+import os
+from typing import List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # type: ignore[assignment]
+
+# 是否支持内核态拷贝：copy_file_range (Linux >= 4.5，XFS/Btrfs 上可直接 reflink)，
+# 其次 sendfile；都不可用时 (如 Windows) 使用缓冲区读写
+HAS_COPY_FILE_RANGE = hasattr(os, "copy_file_range")
+HAS_SENDFILE = hasattr(os, "sendfile")
+# 合并前一次性为目标文件预分配空间 (Linux/BSD)，减少扩展分配与碎片
+HAS_FALLOCATE = hasattr(os, "posix_fallocate")
+# 回退为缓冲区读写时的块大小
+COPY_BUFFER_SIZE = 1024 * 1024  # 1MB
+# 合并后的文件超过可用内存一半时，目标文件以 O_DIRECT 打开写入，不经过页缓存 (Linux)
+HAS_O_DIRECT = hasattr(os, "O_DIRECT") and fcntl is not None
+HAS_FADVISE = hasattr(os, "posix_fadvise")
+
+
+def kernel_copy(out_fd: int, in_fd: int, offset: int, size: int) -> int:
+    """
+    在内核中将 in_fd 从 offset 开始的数据追加到 out_fd 的当前位置，返回已拷贝到的偏移
+
+    copy_file_range 不支持时 (如跨文件系统 EXDEV) 退到 sendfile，
+    均失败时返回当前偏移，由调用方拷贝剩余部分。
+    """
+    if HAS_COPY_FILE_RANGE:
+        try:
+            while offset < size:
+                copied = os.copy_file_range(in_fd, out_fd, size - offset, offset)
+                if copied == 0:
+                    break
+                offset += copied
+        except OSError:
+            pass
+    if HAS_SENDFILE:
+        try:
+            while offset < size:
+                sent = os.sendfile(out_fd, in_fd, offset, size - offset)
+                if sent == 0:
+                    break
+                offset += sent
+        except OSError:
+            pass
+    return offset
+
+
+def preallocate(fd: int, size: int):
+    """为文件预分配 size 字节的连续空间，不支持时忽略"""
+    if not HAS_FALLOCATE or size <= 0:
+        return
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except OSError:
+        pass
+
+
+def try_lock(fd: int, exclusive: bool) -> bool:
+    """
+    以非阻塞方式对文件加 flock 锁（共享或独占），返回是否成功
+
+    锁属于打开的文件描述，关闭描述符后释放，对同一进程内另外打开的描述符同样互斥；
+    不支持 flock 的平台 (Windows) 直接返回 True。
+    """
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(fd, (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
+
+
+def available_memory() -> Optional[int]:
+    """系统可用内存字节数（/proc/meminfo 中的 MemAvailable），无法获取时返回 None"""
+    try:
+        with open("/proc/meminfo", "rb") as f:
+            for line in f:
+                if line.startswith(b"MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def drop_page_cache(fd: int):
+    """提示内核释放文件的页缓存，不支持时忽略"""
+    if HAS_FADVISE:
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        except OSError:
+            pass
+
+
+def concat_files(target_path: str, part_paths: List[str], hasher=None):
+    """
+    按顺序将 part_paths 拼接为 target_path（同步，在线程池中调用）
+
+    数据拷贝优先交给内核 (copy_file_range / sendfile)，不经过用户态缓冲区；
+    不支持或失败时回退为缓冲区读写。
+    提供 hasher 时，每个分片先读一遍用于更新哈希，随后的拷贝命中页缓存，
+    从而与合并一起完成整个文件的哈希计算，无需再读取合并后的文件。
+    合并后的文件超过可用内存一半时改用 O_DIRECT 写入，见 _concat_files_direct。
+    """
+    total_size = sum(os.path.getsize(path) for path in part_paths)
+    if HAS_O_DIRECT:
+        memory = available_memory()
+        if memory is not None and total_size > memory // 2:
+            if _concat_files_direct(target_path, part_paths, total_size, hasher):
+                return
+    buffer = memoryview(bytearray(COPY_BUFFER_SIZE))
+    with open(target_path, "wb", buffering=0) as target_file:
+        out_fd = target_file.fileno()
+        preallocate(out_fd, total_size)
+        for path in part_paths:
+            with open(path, "rb", buffering=0) as part_file:
+                if hasher is not None:
+                    while n := part_file.readinto(buffer):
+                        hasher.update(buffer[:n])
+
+                in_fd = part_file.fileno()
+                offset = kernel_copy(out_fd, in_fd, 0, os.fstat(in_fd).st_size)
+
+                # 回退：拷贝内核拷贝未完成的剩余部分
+                part_file.seek(offset)
+                while n := part_file.readinto(buffer):
+                    _write_all(out_fd, buffer[:n])
+        # 预分配后文件长度已为 total_size，按实际写入位置截断
+        target_file.truncate()
+
+
+def _concat_files_direct(target_path: str, part_paths: List[str], total_size: int, hasher=None) -> bool:
+    """
+    以 O_DIRECT 打开目标文件拼接分片，写入不经过页缓存，返回是否已完成
+
+    远大于内存的文件经页缓存写入会挤出热点页并堆积脏页；这里分片按缓冲区读取
+    （命中上传时留下的页缓存，同时更新 hasher），凑满按页对齐的缓冲区后直接写盘，
+    每个分片读完即释放其页缓存。文件系统不支持 O_DIRECT 时 (如 tmpfs 返回 EINVAL)
+    返回 False，由调用方使用普通方式合并。
+    """
+    try:
+        out_fd = os.open(target_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_DIRECT, 0o644)
+    except OSError:
+        return False
+    try:
+        preallocate(out_fd, total_size)
+        # 匿名映射按页对齐，满足 O_DIRECT 对缓冲区地址与写入长度的对齐要求
+        with mmap.mmap(-1, COPY_BUFFER_SIZE) as buffer_map, memoryview(buffer_map) as buffer:
+            filled = 0
+            for path in part_paths:
+                with open(path, "rb", buffering=0) as part_file:
+                    while n := part_file.readinto(buffer[filled:]):
+                        if hasher is not None:
+                            hasher.update(buffer[filled:filled + n])
+                        filled += n
+                        if filled == COPY_BUFFER_SIZE:
+                            _write_direct(out_fd, buffer)
+                            filled = 0
+                    drop_page_cache(part_file.fileno())
+            if filled:
+                # 末尾不足一个对齐块的部分无法直接写入，关闭 O_DIRECT 后写入
+                _clear_direct(out_fd)
+                _write_direct(out_fd, buffer[:filled])
+        # 预分配后文件长度已为 total_size，按实际写入位置截断
+        os.ftruncate(out_fd, os.lseek(out_fd, 0, os.SEEK_CUR))
+    finally:
+        os.close(out_fd)
+    return True
+
+
+def _clear_direct(fd: int):
+    flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+    fcntl.fcntl(fd, fcntl.F_SETFL, flags & ~os.O_DIRECT)
+
+
+def _write_all(fd: int, data: memoryview):
+    """写入全部数据（一次 write 可能只写入一部分）"""
+    while data:
+        data = data[os.write(fd, data):]
+
+
+def _write_direct(fd: int, data: memoryview):
+    """写入全部数据；设备要求的对齐超出缓冲区对齐 (EINVAL) 时关闭 O_DIRECT 继续写入"""
+    while data:
+        try:
+            written = os.write(fd, data)
+        except OSError as e:
+            if e.errno != errno.EINVAL:
+                raise
+            _clear_direct(fd)
+            written = os.write(fd, data)
+        data = data[written:]
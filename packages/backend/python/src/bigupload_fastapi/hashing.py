@@ -0,0 +1,119 @@
+"""
+Hash helpers for BigUpload FastAPI package
+"""
+
+import hashlib
+import mmap
+import os
+from typing import Iterable
+
+try:
+    import blake3
+except ImportError:  # 可选依赖: pip install bigupload-fastapi[blake3]
+    blake3 = None  # type: ignore[assignment]
+
+# SHA-256 构造函数。hashlib 链接 OpenSSL 时即为 openssl_sha256，
+# OpenSSL 在运行时检测 CPU 并使用 SHA-NI / ARMv8 SHA 指令，无需额外的加速库
+_sha256 = hashlib.sha256
+# 预先创建的空 SHA-256 上下文；每个分片/文件需要新的上下文时 copy() 复制其状态，
+# 比每次调用构造函数省去参数解析与初始化
+_EMPTY_SHA256 = _sha256()
+
+# 支持的哈希算法
+HASH_ALGORITHMS = ("sha256", "blake3")
+# 文件哈希模式：full 为整个文件内容的哈希，merkle 为各分片摘要按顺序拼接后的哈希
+HASH_MODES = ("full", "merkle")
+# 计算文件哈希时的读缓冲区大小（hashlib.file_digest 不可用时）
+HASH_BUFFER_SIZE = 1024 * 1024  # 1MB
+# 不小于该大小的文件通过 mmap 计算 SHA-256，并提示内核顺序预读；更小的文件 file_digest 开销更低
+HASH_MMAP_MIN_SIZE = 64 * 1024 * 1024  # 64MB
+
+
+def check_hash_algorithm(algorithm: str):
+    """检查哈希算法是否受支持且依赖已安装"""
+    if algorithm not in HASH_ALGORITHMS:
+        raise ValueError(f"不支持的哈希算法: {algorithm}，可选: {', '.join(HASH_ALGORITHMS)}")
+    if algorithm == "blake3" and blake3 is None:
+        raise ValueError("使用 blake3 需要安装可选依赖: pip install bigupload-fastapi[blake3]")
+
+
+def check_hash_mode(mode: str):
+    """检查文件哈希模式是否受支持"""
+    if mode not in HASH_MODES:
+        raise ValueError(f"不支持的哈希模式: {mode}，可选: {', '.join(HASH_MODES)}")
+
+
+def new_hasher(algorithm: str = "sha256"):
+    """创建增量哈希对象"""
+    if algorithm == "blake3":
+        return blake3.blake3()
+    return _EMPTY_SHA256.copy()
+
+
+def hash_file(file_path: str, algorithm: str = "sha256") -> str:
+    """
+    同步计算文件哈希（在线程池中调用）
+
+    SHA-256 对大文件使用 mmap（MADV_SEQUENTIAL），其余使用 hashlib.file_digest (Python 3.11+)，
+    均在 C 中完成并释放 GIL；BLAKE3 使用 mmap 并由其多线程实现并行计算。
+    """
+    return _file_hasher(file_path, algorithm, multithreaded=True).hexdigest()
+
+
+def hash_file_digest(file_path: str, algorithm: str = "sha256") -> bytes:
+    """
+    同步计算文件哈希，返回原始摘要（用于 merkle 模式的分片摘要）
+
+    各分片已在线程池中并行计算，BLAKE3 不再为每个分片启用多线程，避免线程数成倍增长。
+    """
+    return _file_hasher(file_path, algorithm).digest()
+
+
+def hash_file_range_digest(file_path: str, offset: int, size: int, algorithm: str = "sha256") -> bytes:
+    """
+    同步计算文件中 [offset, offset + size) 区间的哈希，返回原始摘要（直接写入模式下的分片摘要）
+
+    通过 mmap 直接对页缓存中的区间计算哈希，不复制到用户态缓冲区；
+    多个区间可在线程池中并行计算。
+    """
+    hasher = new_hasher(algorithm)
+    with open(file_path, 'rb', buffering=0) as f:
+        end = min(offset + size, os.fstat(f.fileno()).st_size)
+        if end <= offset:
+            return hasher.digest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if hasattr(mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+                # madvise 的起始地址需按页对齐
+                start = offset - offset % mmap.PAGESIZE
+                mm.madvise(mmap.MADV_SEQUENTIAL, start, end - start)
+            with memoryview(mm) as view:
+                hasher.update(view[offset:end])
+    return hasher.digest()
+
+
+def merkle_root(digests: Iterable[bytes], algorithm: str = "sha256") -> str:
+    """merkle 模式的文件哈希：按分片顺序拼接各分片原始摘要后再计算一次哈希"""
+    root = new_hasher(algorithm)
+    for digest in digests:
+        root.update(digest)
+    return root.hexdigest()
+
+
+def _file_hasher(file_path: str, algorithm: str, multithreaded: bool = False):
+    if algorithm == "blake3":
+        max_threads = blake3.blake3.AUTO if multithreaded else 1
+        return blake3.blake3(max_threads=max_threads).update_mmap(file_path)
+
+    with open(file_path, 'rb', buffering=0) as f:
+        if os.fstat(f.fileno()).st_size >= HASH_MMAP_MIN_SIZE:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if hasattr(mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+                    mm.madvise(mmap.MADV_SEQUENTIAL)
+                return _sha256(mm)
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(f, _EMPTY_SHA256.copy)
+        hash_sha256 = _EMPTY_SHA256.copy()
+        buffer = memoryview(bytearray(HASH_BUFFER_SIZE))
+        while n := f.readinto(buffer):
+            hash_sha256.update(buffer[:n])
+        return hash_sha256
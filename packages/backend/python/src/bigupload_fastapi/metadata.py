@@ -0,0 +1,140 @@
+"""
+Upload metadata types for BigUpload FastAPI package
+
+仅依赖标准库且带完整类型注解，可选择使用 mypyc 编译为 C 扩展（见 setup.py）。
+"""
+
+import base64
+from enum import Enum
+from typing import Dict, Iterator, Optional
+
+
+class ChunkBitmap:
+    """
+    已上传分片位图
+
+    第 i 个分片对应 bitmap[i >> 3] 的第 (i & 7) 位，置位/查询为 O(1)，
+    并维护已置位数量，len() 无需遍历。
+    """
+
+    __slots__ = ("_bits", "_count")
+
+    def __init__(self, chunk_total: int = 0, data: bytes = b""):
+        self._bits = bytearray(data) if data else bytearray((chunk_total + 7) >> 3)
+        # 整个位图转为一个整数后统计置位数，计数在 C 中完成，不逐字节遍历
+        self._count = bin(int.from_bytes(self._bits, "little")).count("1") if data else 0
+
+    def add(self, chunk_index: int) -> None:
+        """标记分片已上传"""
+        byte_index = chunk_index >> 3
+        if byte_index >= len(self._bits):
+            self._bits.extend(bytes(byte_index + 1 - len(self._bits)))
+        mask = 1 << (chunk_index & 7)
+        if not self._bits[byte_index] & mask:
+            self._bits[byte_index] |= mask
+            self._count += 1
+
+    def discard(self, chunk_index: int) -> None:
+        """取消分片的已上传标记"""
+        byte_index = chunk_index >> 3
+        mask = 1 << (chunk_index & 7)
+        if byte_index < len(self._bits) and self._bits[byte_index] & mask:
+            self._bits[byte_index] &= ~mask
+            self._count -= 1
+
+    def all_set(self, chunk_total: int) -> bool:
+        """前 chunk_total 个分片是否全部已上传（整字节比较在 C 中完成，不逐个分片遍历）"""
+        full_bytes, tail = chunk_total >> 3, chunk_total & 7
+        if len(self._bits) < full_bytes + (1 if tail else 0):
+            return False
+        if self._bits.count(0xFF, 0, full_bytes) != full_bytes:
+            return False
+        mask = (1 << tail) - 1
+        return self._bits[full_bytes] & mask == mask if tail else True
+
+    def first_missing(self, chunk_total: int) -> Optional[int]:
+        """返回前 chunk_total 个分片中第一个缺失的索引，全部存在时返回 None"""
+        full_bytes = chunk_total >> 3
+        if self._bits.count(0xFF, 0, full_bytes) == full_bytes:
+            start = full_bytes << 3
+        else:
+            start = 0
+        for chunk_index in range(start, chunk_total):
+            if chunk_index not in self:
+                return chunk_index
+        return None
+
+    def to_bytes(self) -> bytes:
+        return bytes(self._bits)
+
+    def to_base64(self) -> str:
+        """位图的 base64 编码，用于 format=bitmap 的接口响应"""
+        return base64.b64encode(self._bits).decode("ascii")
+
+    def __contains__(self, chunk_index: int) -> bool:
+        byte_index = chunk_index >> 3
+        return byte_index < len(self._bits) and bool(self._bits[byte_index] >> (chunk_index & 7) & 1)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[int]:
+        bits = self._bits
+        for byte_index in range(len(bits)):
+            byte = bits[byte_index]
+            if byte:
+                for bit in range(8):
+                    if byte >> bit & 1:
+                        yield (byte_index << 3) | bit
+
+
+class UploadStatus(str, Enum):
+    """
+    上传状态
+
+    继承 str，接口响应与 SQLite 中仍为 "uploading" 等字符串；
+    各实例共享同一个枚举成员，无需逐个保存状态字符串。
+    """
+
+    UPLOADING = "uploading"
+
+
+class FileMetadata:
+    """文件元数据类（使用 __slots__，大量并发上传时减少每个实例的内存占用）"""
+
+    __slots__ = (
+        "file_id", "file_name", "file_hash", "chunk_total",
+        "file_size", "chunk_size", "hash_algorithm", "uploaded_chunks", "chunk_digests", "status",
+    )
+
+    def __init__(
+        self,
+        file_id: str,
+        file_name: str,
+        file_hash: str,
+        chunk_total: int,
+        file_size: int = 0,
+        chunk_size: int = 0,
+        hash_algorithm: str = ""
+    ):
+        self.file_id = file_id
+        self.file_name = file_name
+        self.file_hash = file_hash
+        self.chunk_total = chunk_total
+        # 文件大小与分片大小，均大于0时分片直接写入预分配的文件
+        self.file_size = file_size
+        self.chunk_size = chunk_size
+        # 该上传使用的哈希算法，空字符串表示使用服务端配置的算法
+        self.hash_algorithm = hash_algorithm
+        self.uploaded_chunks = ChunkBitmap(chunk_total)
+        # 已校验分片的原始摘要（分片索引 -> digest），merkle 模式合并时无需重新读取这些分片
+        self.chunk_digests: Dict[int, bytes] = {}
+        self.status = UploadStatus.UPLOADING
+
+
+def set_chunk_digest(metadata: FileMetadata, chunk_index: int, digest: Optional[bytes]) -> None:
+    """记录分片摘要；重新上传且未计算摘要时清除旧摘要"""
+    if digest:
+        metadata.chunk_digests[chunk_index] = digest
+    else:
+        metadata.chunk_digests.pop(chunk_index, None)
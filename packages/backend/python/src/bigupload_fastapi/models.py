@@ -14,6 +14,7 @@ class VerifyRequest(BaseModel):
     fileSize: Optional[int] = None
     chunkTotal: Optional[int] = None
     chunkSize: Optional[int] = None
+    hashAlgorithm: Optional[str] = None  # 客户端希望使用的哈希算法（sha256/blake3），默认使用服务端配置
 
 
 class VerifyResponse(BaseModel):
@@ -23,7 +24,10 @@ class VerifyResponse(BaseModel):
     exists: bool
     finish: bool
     uploadedChunks: List[int] = []
+    uploadedBitmap: Optional[str] = None  # format=bitmap 时返回的 base64 位图
     url: Optional[str] = None
+    hashAlgorithm: str = "sha256"  # 服务端校验 fileHash/chunkHash 使用的哈希算法
+    hashMode: str = "full"  # 合并请求未指定 hashMode 时服务端使用的文件哈希模式
     message: str
 
 
@@ -32,7 +36,9 @@ class UploadResponse(BaseModel):
     success: bool = True
     fileId: str
     chunkIndex: int
-    uploadedChunks: List[int] = []
+    uploadedCount: int = 0  # 已上传分片数
+    uploadedChunks: Optional[List[int]] = None  # format=list 时返回的已上传分片索引
+    uploadedBitmap: Optional[str] = None  # format=bitmap 时返回的 base64 位图
     message: str
 
 
@@ -43,6 +49,7 @@ class MergeRequest(BaseModel):
     fileHash: str
     chunkTotal: int
     fileSize: Optional[int] = None
+    hashMode: Optional[str] = None  # full: 整个文件的哈希；merkle: 各分片摘要按顺序拼接后的哈希；默认使用服务端配置
 
 
 class MergeResponse(BaseModel):
@@ -50,6 +57,8 @@ class MergeResponse(BaseModel):
     success: bool = True
     fileId: str
     url: str
+    hashAlgorithm: str = "sha256"
+    hashMode: str = "full"
     message: str
 
 
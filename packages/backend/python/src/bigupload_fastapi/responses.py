@@ -0,0 +1,69 @@
+"""
+Custom responses for BigUpload FastAPI package
+"""
+
+import os
+from typing import Any
+
+import anyio
+import anyio.to_thread
+import orjson
+from fastapi.responses import FileResponse, JSONResponse
+from starlette.types import Receive, Scope, Send
+
+# ASGI zero-copy-send 扩展名称，服务器支持时可直接调用 sendfile(2) 发送文件
+ZERO_COPY_SEND_EXTENSION = "http.response.zerocopysend"
+
+
+class ZeroCopyFileResponse(FileResponse):
+    """
+    文件下载响应
+
+    ASGI 服务器声明支持 zero-copy-send 扩展时，将文件句柄直接交给服务器，
+    由内核 sendfile(2) 完成传输，不再在事件循环中逐块读取并发送；
+    否则（或 HEAD / Range 请求）回退到 FileResponse 的默认实现。
+    """
+
+    # 回退路径下每次读取的块大小，减少 send 往返次数
+    chunk_size = 1024 * 1024
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if not self._can_zero_copy(scope):
+            await super().__call__(scope, receive, send)
+            return
+
+        if self.stat_result is None:
+            try:
+                self.stat_result = await anyio.to_thread.run_sync(os.stat, self.path)
+            except FileNotFoundError:
+                raise RuntimeError(f"File at path {self.path} does not exist.")
+            self.set_stat_headers(self.stat_result)
+
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        with open(self.path, "rb") as file:
+            await send({"type": ZERO_COPY_SEND_EXTENSION, "file": file, "more_body": False})
+
+        if self.background is not None:
+            await self.background()
+
+    @staticmethod
+    def _can_zero_copy(scope: Scope) -> bool:
+        """判断当前请求是否可以走 zero-copy-send"""
+        if scope["type"] != "http" or scope["method"].upper() == "HEAD":
+            return False
+        if ZERO_COPY_SEND_EXTENSION not in scope.get("extensions", {}):
+            return False
+        # Range 请求交给 FileResponse 处理
+        return not any(name == b"range" for name, _ in scope.get("headers", []))
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    使用 orjson 序列化的 JSON 响应
+
+    用于直接返回 dict 的接口（/status、/list、/health）；
+    声明了 response_model 的接口由 FastAPI 通过 Pydantic 直接序列化，无需替换。
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
@@ -3,17 +3,24 @@ FastAPI router for BigUpload package
 """
 
 import logging
+import anyio
 from typing import Optional
-from fastapi import APIRouter, Form, File, UploadFile, HTTPException, Depends
-from fastapi.responses import FileResponse
+from urllib.parse import unquote
+from fastapi import APIRouter, Header, HTTPException, Query, Request
 from fastapi.staticfiles import StaticFiles
 
 from .config import UploadConfig
 from .service import UploadService
+from .store import MetadataStore
+from .responses import ORJSONResponse, ZeroCopyFileResponse
+from .streaming import MultipartChunkReader, limit_stream
 from .models import VerifyRequest, VerifyResponse, UploadResponse, MergeRequest, MergeResponse, ErrorResponse
 
 logger = logging.getLogger(__name__)
 
+# 分片上传请求的必填表单字段
+UPLOAD_FIELDS = ("fileId", "fileName", "chunkIndex", "chunkTotal", "fileHash")
+
 
 def create_upload_router(
     upload_path: str = "./uploads",
@@ -24,7 +31,11 @@ def create_upload_router(
     concurrent: int = 3,
     enable_file_server: bool = True,
     file_server_path: str = "/files",
-    config: Optional[UploadConfig] = None
+    hash_algorithm: str = "sha256",
+    hash_mode: str = "full",
+    max_direct_file_size: int = 64 * 1024 * 1024 * 1024,
+    config: Optional[UploadConfig] = None,
+    metadata_store: Optional[MetadataStore] = None
 ) -> APIRouter:
     """
     创建上传路由器
@@ -38,10 +49,17 @@ def create_upload_router(
         concurrent: 并发上传数量
         enable_file_server: 是否启用文件服务
         file_server_path: 文件服务路径
+        hash_algorithm: 文件/分片哈希算法，sha256 或 blake3
+        hash_mode: 默认文件哈希模式，full 或 merkle（merkle 时上传分片即保存摘要，合并不再读取数据做哈希）
+        max_direct_file_size: 直接写入模式下预分配文件的大小上限（字节），max_file_size 为 0 时生效
         config: 自定义配置对象（如果提供则忽略其他参数）
+        metadata_store: 元数据存储（默认进程内存储，需崩溃恢复时使用 LogMetadataStore，多进程部署时使用 SQLiteMetadataStore，多机部署时使用 RedisMetadataStore）
         
     Returns:
         FastAPI APIRouter 实例
+    
+    逐请求的日志为 DEBUG 级别；生产环境可通过
+    logging.getLogger("bigupload_fastapi").setLevel(logging.WARNING) 只保留告警和错误。
     """
     
     # 使用自定义配置或创建新配置
@@ -54,11 +72,14 @@ def create_upload_router(
             chunk_size=chunk_size,
             concurrent=concurrent,
             enable_file_server=enable_file_server,
-            file_server_path=file_server_path
+            file_server_path=file_server_path,
+            hash_algorithm=hash_algorithm,
+            hash_mode=hash_mode,
+            max_direct_file_size=max_direct_file_size
         )
     
     # 创建上传服务实例
-    upload_service = UploadService(config)
+    upload_service = UploadService(config, metadata_store)
     
     # 创建路由器
     router = APIRouter(
@@ -69,10 +90,17 @@ def create_upload_router(
         }
     )
     
+    # 应用启动时创建上传目录并初始化元数据存储，关闭时释放文件描述符和线程池
+    router.add_event_handler("startup", upload_service.init)
+    router.add_event_handler("shutdown", upload_service.close)
+    
     logger.info(f"创建BigUpload路由器: {config}")
     
     @router.post("/verify", response_model=VerifyResponse, summary="验证文件是否存在")
-    async def verify_file(request: VerifyRequest):
+    async def verify_file(
+        request: VerifyRequest,
+        output_format: Optional[str] = Query(None, alias="format", description="bitmap: 以base64位图返回已上传分片")
+    ):
         """
         验证文件是否存在（秒传/断点续传）
         
@@ -81,58 +109,142 @@ def create_upload_router(
         - **fileHash**: 文件MD5哈希值
         - **fileSize**: 文件大小（可选）
         - **chunkTotal**: 分片总数（可选）
+        - **hashAlgorithm**: 客户端希望使用的哈希算法（可选），sha256 或 blake3；大文件使用 blake3 可显著加快校验
+        - **format**: 查询参数，为 bitmap 时以 base64 位图（第i个分片对应第 i>>3 字节的第 i&7 位）返回已上传分片
         """
         try:
-            logger.info(f"验证文件请求: fileId={request.fileId}, fileHash={request.fileHash}")
-            response = await upload_service.verify_file(request)
-            logger.info(f"验证结果: exists={response.exists}, finish={response.finish}")
+            logger.debug("验证文件请求: fileId=%s, fileHash=%s", request.fileId, request.fileHash)
+            response = await upload_service.verify_file(request, bitmap=output_format == "bitmap")
+            logger.debug("验证结果: exists=%s, finish=%s", response.exists, response.finish)
             return response
+        except ValueError as e:
+            logger.warning(f"验证文件参数错误: {e}")
+            raise HTTPException(status_code=400, detail=str(e))
         except Exception as e:
             logger.error(f"验证文件失败: {e}")
             raise HTTPException(status_code=500, detail=str(e))
     
-    @router.post("/upload", response_model=UploadResponse, summary="上传文件分片")
+    @router.post("/upload", response_model=UploadResponse, response_model_exclude_none=True, summary="上传文件分片")
     async def upload_chunk(
-        chunk: UploadFile = File(..., description="分片文件"),
-        fileId: str = Form(..., description="文件ID"),
-        fileName: str = Form(..., description="文件名"),
-        chunkIndex: int = Form(..., description="分片索引"),
-        chunkTotal: int = Form(..., description="分片总数"),
-        fileHash: str = Form(..., description="文件哈希值"),
-        chunkHash: Optional[str] = Form(None, description="分片哈希值")
+        request: Request,
+        output_format: Optional[str] = Query(None, alias="format", description="list/bitmap: 在响应中附带已上传分片")
     ):
         """
-        上传单个分片
+        上传单个分片（multipart/form-data，流式写入磁盘）
         
-        - **chunk**: 分片文件数据
         - **fileId**: 文件唯一标识符
         - **fileName**: 文件名
         - **chunkIndex**: 分片索引（从0开始）
         - **chunkTotal**: 分片总数
         - **fileHash**: 文件SHA-256哈希值
         - **chunkHash**: 分片SHA-256哈希值（可选，用于验证）
+        - **fileSize**: 文件大小（可选，与 chunkSize 同时提供时分片直接写入预分配的文件，合并时无需拼接）
+        - **chunkSize**: 分片大小（可选，除最后一个分片外每个分片的字节数）
+        - **hashAlgorithm**: 哈希算法（可选），sha256 或 blake3，默认使用服务端配置
+        - **chunk**: 分片文件数据（建议放在最后一个字段，以便直接流式写入）
+        - **format**: 查询参数，默认只返回已上传分片数 uploadedCount；为 list / bitmap 时附带索引列表 / base64 位图
         """
         try:
-            logger.info(f"上传分片: fileId={fileId}, chunkIndex={chunkIndex}/{chunkTotal}")
+            reader = MultipartChunkReader(request, file_field="chunk", max_size=config.max_file_size)
+            if not await reader.read_until_file():
+                raise ValueError("缺少分片文件: chunk")
             
-            # 检查文件大小限制
-            if config.max_file_size > 0 and chunk.size and chunk.size > config.max_file_size:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"分片大小超过限制: {chunk.size} > {config.max_file_size}"
-                )
+            # 字段在分片之前到达时直接流式写入，否则先暂存分片再读取字段
+            if all(name in reader.fields for name in UPLOAD_FIELDS):
+                chunk = reader.iter_file()
+            else:
+                chunk = await reader.spool_file()
+            
+            fields = reader.fields
+            missing = [name for name in UPLOAD_FIELDS if name not in fields]
+            if missing:
+                raise ValueError(f"缺少参数: {', '.join(missing)}")
+            fileId = fields["fileId"]
+            chunkIndex = int(fields["chunkIndex"])
+            chunkTotal = int(fields["chunkTotal"])
             
             response = await upload_service.upload_chunk(
                 chunk=chunk,
                 file_id=fileId,
-                file_name=fileName,
+                file_name=fields["fileName"],
                 chunk_index=chunkIndex,
                 chunk_total=chunkTotal,
-                file_hash=fileHash,
-                chunk_hash=chunkHash
+                file_hash=fields["fileHash"],
+                chunk_hash=fields.get("chunkHash") or None,
+                file_size=int(fields.get("fileSize") or 0),
+                chunk_size=int(fields.get("chunkSize") or 0),
+                hash_algorithm=fields.get("hashAlgorithm") or None,
+                output_format=output_format
             )
+            await reader.read_remaining()
             
-            logger.info(f"分片上传成功: chunkIndex={chunkIndex}, 已上传: {len(response.uploadedChunks)}/{chunkTotal}")
+            # 每个分片都会经过这里，仅在开启 DEBUG 时格式化日志
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "分片上传成功: fileId=%s, chunkIndex=%d, 已上传: %d/%d",
+                    fileId, chunkIndex, response.uploadedCount, chunkTotal
+                )
+            return response
+            
+        except ValueError as e:
+            logger.warning(f"上传分片参数错误: {e}")
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            logger.error(f"上传分片失败: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+    
+    @router.put(
+        "/upload/{file_id}/{chunk_index}",
+        response_model=UploadResponse,
+        response_model_exclude_none=True,
+        summary="上传文件分片（原始请求体）"
+    )
+    async def upload_chunk_raw(
+        request: Request,
+        file_id: str,
+        chunk_index: int,
+        x_chunk_total: int = Header(..., description="分片总数"),
+        x_file_hash: str = Header(..., description="文件SHA-256哈希值"),
+        x_file_name: str = Header(..., description="文件名（URL编码）"),
+        x_chunk_hash: Optional[str] = Header(None, description="分片SHA-256哈希值（可选，用于验证）"),
+        x_file_size: int = Header(0, description="文件大小（可选）"),
+        x_chunk_size: int = Header(0, description="分片大小（可选）"),
+        x_hash_algorithm: Optional[str] = Header(None, description="哈希算法（可选），sha256 或 blake3"),
+        output_format: Optional[str] = Query(None, alias="format", description="list/bitmap: 在响应中附带已上传分片")
+    ):
+        """
+        上传单个分片，请求体即分片数据，省去 multipart 解析
+        
+        - **file_id**: 文件唯一标识符（路径参数）
+        - **chunk_index**: 分片索引（路径参数，从0开始）
+        - **X-Chunk-Total**: 分片总数
+        - **X-File-Hash**: 文件SHA-256哈希值
+        - **X-File-Name**: 文件名（URL编码）
+        - **X-Chunk-Hash**: 分片SHA-256哈希值（可选，用于验证）
+        - **X-File-Size** / **X-Chunk-Size**: 文件大小/分片大小（可选，同时提供时分片直接写入预分配的文件）
+        - **X-Hash-Algorithm**: 哈希算法（可选），sha256 或 blake3，默认使用服务端配置
+        - **format**: 查询参数，同 POST /upload
+        """
+        try:
+            response = await upload_service.upload_chunk(
+                chunk=limit_stream(request.stream(), config.max_file_size),
+                file_id=file_id,
+                file_name=unquote(x_file_name),
+                chunk_index=chunk_index,
+                chunk_total=x_chunk_total,
+                file_hash=x_file_hash,
+                chunk_hash=x_chunk_hash or None,
+                file_size=x_file_size,
+                chunk_size=x_chunk_size,
+                hash_algorithm=x_hash_algorithm or None,
+                output_format=output_format
+            )
+            
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "分片上传成功: fileId=%s, chunkIndex=%d, 已上传: %d/%d",
+                    file_id, chunk_index, response.uploadedCount, x_chunk_total
+                )
             return response
             
         except ValueError as e:
@@ -152,13 +264,14 @@ def create_upload_router(
         - **fileHash**: 文件SHA-256哈希值
         - **chunkTotal**: 分片总数
         - **fileSize**: 文件大小（可选）
+        - **hashMode**: 哈希模式（可选），full 为整个文件的哈希，merkle 为各分片摘要按顺序拼接后的哈希；默认使用服务端配置的 hash_mode
         """
         try:
-            logger.info(f"合并分片请求: fileId={request.fileId}, chunkTotal={request.chunkTotal}")
+            logger.debug("合并分片请求: fileId=%s, chunkTotal=%d", request.fileId, request.chunkTotal)
             
             response = await upload_service.merge_chunks(request)
             
-            logger.info(f"文件合并成功: fileId={request.fileId}, url={response.url}")
+            logger.info("文件合并成功: fileId=%s, url=%s", request.fileId, response.url)
             return response
             
         except ValueError as e:
@@ -168,7 +281,7 @@ def create_upload_router(
             logger.error(f"合并分片失败: {e}")
             raise HTTPException(status_code=500, detail=str(e))
     
-    @router.get("/health", summary="健康检查")
+    @router.get("/health", response_class=ORJSONResponse, summary="健康检查")
     async def health_check():
         """健康检查接口"""
         return {
@@ -181,31 +294,41 @@ def create_upload_router(
                 "max_file_size": config.max_file_size,
                 "chunk_size": config.chunk_size,
                 "concurrent": config.concurrent,
-                "enable_file_server": config.enable_file_server
+                "enable_file_server": config.enable_file_server,
+                "hash_algorithm": config.hash_algorithm
             }
         }
     
-    @router.get("/status/{file_id}", summary="查询文件上传状态")
-    async def get_upload_status(file_id: str):
+    @router.get("/status/{file_id}", response_class=ORJSONResponse, summary="查询文件上传状态")
+    async def get_upload_status(
+        file_id: str,
+        output_format: Optional[str] = Query(None, alias="format", description="bitmap: 以base64位图返回已上传分片")
+    ):
         """查询指定文件的上传状态"""
-        metadata = upload_service.get_file_metadata(file_id)
+        metadata = await upload_service.get_file_metadata(file_id)
         if not metadata:
             raise HTTPException(status_code=404, detail="文件不存在")
         
+        uploaded: dict
+        if output_format == "bitmap":
+            uploaded = {"uploadedBitmap": metadata.uploaded_chunks.to_base64()}
+        else:
+            uploaded = {"uploadedChunks": list(metadata.uploaded_chunks)}
+        
         return {
             "fileId": metadata.file_id,
             "fileName": metadata.file_name,
             "fileHash": metadata.file_hash,
             "chunkTotal": metadata.chunk_total,
-            "uploadedChunks": list(metadata.uploaded_chunks),
+            **uploaded,
             "progress": len(metadata.uploaded_chunks) / metadata.chunk_total * 100,
             "status": metadata.status
         }
     
-    @router.get("/list", summary="列出正在上传的文件")
+    @router.get("/list", response_class=ORJSONResponse, summary="列出正在上传的文件")
     async def list_uploading_files():
         """列出所有正在上传的文件"""
-        files = upload_service.list_uploading_files()
+        files = await upload_service.list_uploading_files()
         return [
             {
                 "fileId": metadata.file_id,
@@ -225,8 +348,11 @@ def create_upload_router(
         async def download_file(filename: str):
             """下载上传的文件"""
             file_path = config.get_upload_file_path(filename)
+            # 上传目录中还有直接写入模式的 .{fileId}.partial 与临时目录等，只提供已合并的文件
+            if filename.startswith(".") or not await anyio.Path(file_path).is_file():
+                raise HTTPException(status_code=404, detail="文件不存在")
             try:
-                return FileResponse(
+                return ZeroCopyFileResponse(
                     path=file_path,
                     filename=filename,
                     media_type='application/octet-stream'
@@ -3,64 +3,90 @@ Core upload service for BigUpload FastAPI package
 """
 
 import os
-import hashlib
+import errno
 import shutil
-import aiofiles
-from pathlib import Path
-from typing import Dict, List, Set, Optional
-from fastapi import UploadFile
+import asyncio
+import anyio
+import anyio.to_thread
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import AsyncIterable, AsyncIterator, Dict, List, Optional, Tuple
 
 from .config import UploadConfig
 from .models import VerifyRequest, VerifyResponse, UploadResponse, MergeRequest, MergeResponse
+from .store import FileMetadata, MetadataStore, MemoryMetadataStore
+from .streaming import coalesce_stream
+from .fileops import concat_files, try_lock
+from .hashing import check_hash_algorithm, check_hash_mode, hash_file, hash_file_digest, hash_file_range_digest, merkle_root, new_hasher
 
-
-class FileMetadata:
-    """文件元数据类"""
-    
-    def __init__(self, file_id: str, file_name: str, file_hash: str, chunk_total: int):
-        self.file_id = file_id
-        self.file_name = file_name
-        self.file_hash = file_hash
-        self.chunk_total = chunk_total
-        self.uploaded_chunks: Set[int] = set()
-        self.status = "uploading"
+# 单个文件的最大分片数：分片位图等按客户端提供的 chunkTotal / chunkIndex 分配，需限制其范围
+MAX_CHUNK_TOTAL = 1_000_000
 
 
 class UploadService:
     """文件上传服务类"""
     
-    def __init__(self, config: UploadConfig):
+    def __init__(self, config: UploadConfig, metadata_store: Optional[MetadataStore] = None):
         self.config = config
-        # 文件元数据存储（生产环境建议使用Redis或数据库）
-        self._file_metadata: Dict[str, FileMetadata] = {}
+        # 文件元数据存储（多进程部署时使用 SQLiteMetadataStore 等共享存储）
+        self._store = metadata_store or MemoryMetadataStore()
         # 文件哈希到文件路径的映射（用于秒传）
         self._hash_to_file: Dict[str, str] = {}
+        # merkle 模式下并行计算分片摘要的线程池（hashlib 计算时释放 GIL），首次使用时创建，应用关闭时停止
+        self._hash_executor: Optional[ThreadPoolExecutor] = None
+        # 直接写入模式下各文件正在使用的写入任务（仅在有分片写入时打开）
+        self._partial_writers: Dict[str, _PartialFileWriter] = {}
+    
+    async def init(self):
+        """应用启动时调用：创建上传目录并初始化元数据存储"""
+        await self.config.init()
+        await self._store.init()
     
-    async def verify_file(self, request: VerifyRequest) -> VerifyResponse:
+    async def close(self):
+        """应用关闭时调用：关闭仍打开的直接写入文件并停止哈希线程池"""
+        writers, self._partial_writers = self._partial_writers, {}
+        for writer in writers.values():
+            await writer.close()
+        executor, self._hash_executor = self._hash_executor, None
+        if executor is not None:
+            await anyio.to_thread.run_sync(partial(executor.shutdown, wait=True, cancel_futures=True))
+    
+    async def verify_file(self, request: VerifyRequest, bitmap: bool = False) -> VerifyResponse:
         """
         验证文件是否存在（秒传/断点续传）
+
+        bitmap 为 True 时以 base64 位图返回已上传分片，而不是索引列表
         """
         # 检查是否有相同fileId的未完成上传
-        if request.fileId in self._file_metadata:
-            metadata = self._file_metadata[request.fileId]
+        metadata = await self._store.get(request.fileId)
+        if metadata:
             return VerifyResponse(
+                hashAlgorithm=self._hash_algorithm(metadata),
+                hashMode=self.config.hash_mode,
                 fileId=request.fileId,
                 exists=False,
                 finish=False,
-                uploadedChunks=list(metadata.uploaded_chunks),
+                **self._uploaded_chunks_fields(metadata, bitmap),
                 message="发现未完成的上传"
             )
         
+        # 新的上传：客户端可选择哈希算法（如大文件使用 blake3）
+        hash_algorithm = request.hashAlgorithm or self.config.hash_algorithm
+        check_hash_algorithm(hash_algorithm)
+        
         # 检查是否有相同fileHash的完成文件（秒传）
         file_extension = self._get_file_extension(request.fileName)
         target_filename = f"{request.fileHash}{file_extension}"
         target_path = self.config.get_upload_file_path(target_filename)
         
-        if os.path.exists(target_path):
+        if await anyio.Path(target_path).exists():
             file_url = self.config.get_file_url(target_filename)
             # 更新哈希映射
             self._hash_to_file[request.fileHash] = target_path
             return VerifyResponse(
+                hashAlgorithm=hash_algorithm,
+                hashMode=self.config.hash_mode,
                 fileId=request.fileId,
                 exists=True,
                 finish=True,
@@ -70,18 +96,22 @@ class UploadService:
             )
         
         # 检查是否有相同fileHash的未完成上传
-        for metadata in self._file_metadata.values():
-            if metadata.file_hash == request.fileHash and metadata.file_id != request.fileId:
-                return VerifyResponse(
-                    fileId=metadata.file_id,
-                    exists=False,
-                    finish=False,
-                    uploadedChunks=list(metadata.uploaded_chunks),
-                    message="发现相同哈希值的未完成上传"
-                )
+        metadata = await self._store.find_by_hash(request.fileHash)
+        if metadata and metadata.file_id != request.fileId:
+            return VerifyResponse(
+                hashAlgorithm=self._hash_algorithm(metadata),
+                hashMode=self.config.hash_mode,
+                fileId=metadata.file_id,
+                exists=False,
+                finish=False,
+                **self._uploaded_chunks_fields(metadata, bitmap),
+                message="发现相同哈希值的未完成上传"
+            )
         
         # 没有找到任何相关文件
         return VerifyResponse(
+            hashAlgorithm=hash_algorithm,
+            hashMode=self.config.hash_mode,
             fileId=request.fileId,
             exists=False,
             finish=False,
@@ -91,141 +121,627 @@ class UploadService:
     
     async def upload_chunk(
         self,
-        chunk: UploadFile,
+        chunk: AsyncIterable[bytes],
         file_id: str,
         file_name: str,
         chunk_index: int,
         chunk_total: int,
         file_hash: str,
-        chunk_hash: Optional[str] = None
+        chunk_hash: Optional[str] = None,
+        file_size: int = 0,
+        chunk_size: int = 0,
+        hash_algorithm: Optional[str] = None,
+        output_format: Optional[str] = None
     ) -> UploadResponse:
         """
         上传分片
+
+        chunk 为分片数据的异步字节流，合并为 1MB 的块后边接收边写入磁盘并计算哈希。
+        提供 file_size 和 chunk_size 时，分片按 chunk_index * chunk_size 偏移直接写入预分配的文件，
+        合并时只需重命名；否则每个分片单独保存到临时目录，合并时再拼接。
+        hash_algorithm 为该上传的哈希算法，由首个分片确定，未提供时使用服务端配置。
+        响应默认只包含已上传分片数；output_format 为 list / bitmap 时附带索引列表 / base64 位图，
+        避免每个分片的响应都展开并序列化整个分片列表。
         """
-        # 创建或获取文件元数据
-        if file_id not in self._file_metadata:
-            self._file_metadata[file_id] = FileMetadata(
-                file_id=file_id,
-                file_name=file_name,
-                file_hash=file_hash,
-                chunk_total=chunk_total
-            )
-        
-        metadata = self._file_metadata[file_id]
-        
-        # 确保临时目录存在
-        temp_dir_path = self.config.get_temp_dir_path(file_id)
-        Path(temp_dir_path).mkdir(parents=True, exist_ok=True)
-        
-        # 保存分片文件
-        chunk_file_path = self.config.get_chunk_file_path(file_id, chunk_index)
-        async with aiofiles.open(chunk_file_path, 'wb') as f:
-            content = await chunk.read()
-            await f.write(content)
+        if not 0 < chunk_total <= MAX_CHUNK_TOTAL:
+            raise ValueError(f"分片总数超出范围: {chunk_total}，应为 1 ~ {MAX_CHUNK_TOTAL}")
+        if not 0 <= chunk_index < chunk_total:
+            raise ValueError(f"分片索引超出范围: {chunk_index}")
+        if self.config.max_file_size > 0 and file_size > self.config.max_file_size:
+            raise ValueError(f"文件大小超过限制: {file_size} > {self.config.max_file_size}")
+        direct = file_size > 0 and chunk_size > 0
+        if direct:
+            # 直接写入模式按 fileSize 预分配磁盘空间，创建文件前校验大小
+            if not self.config.max_file_size and file_size > self.config.max_direct_file_size:
+                raise ValueError(f"文件大小超过直接写入模式的限制: {file_size} > {self.config.max_direct_file_size}")
+            if chunk_size > self.config.chunk_size:
+                raise ValueError(f"分片大小超过限制: {chunk_size} > {self.config.chunk_size}")
+            if chunk_total != -(-file_size // chunk_size):
+                raise ValueError(f"分片总数与文件大小不匹配: {chunk_total}，应为 {-(-file_size // chunk_size)}")
+        if hash_algorithm:
+            check_hash_algorithm(hash_algorithm)
+        # 创建文件元数据（已存在时保持不变，同一文件的所有分片使用相同的写入方式）
+        metadata = await self._store.get(file_id)
+        created = False
+        if not metadata:
+            # 合并后才到达的分片（如由其他 worker 合并）不再为其创建新的上传
+            target_filename = f"{file_hash}{self._get_file_extension(file_name)}"
+            if await anyio.Path(self.config.get_upload_file_path(target_filename)).exists():
+                raise ValueError(f"文件已上传完成: {file_id}")
+            if direct:
+                # 先创建预分配文件再创建元数据：元数据存在时该文件一定存在，直到合并时被重命名
+                await anyio.to_thread.run_sync(_create_partial_file, self.config.get_partial_file_path(file_id), file_size)
+            try:
+                metadata = await self._store.create(FileMetadata(
+                    file_id=file_id,
+                    file_name=file_name,
+                    file_hash=file_hash,
+                    chunk_total=chunk_total,
+                    file_size=file_size if direct else 0,
+                    chunk_size=chunk_size if direct else 0,
+                    hash_algorithm=hash_algorithm or self.config.hash_algorithm
+                ))
+            except BaseException:
+                await self._discard_upload(file_id, direct)
+                raise
+            created = True
+        if chunk_total != metadata.chunk_total:
+            raise ValueError(f"分片总数与该上传不一致: {chunk_total}，应为 {metadata.chunk_total}")
+        algorithm = self._hash_algorithm(metadata)
+        if hash_algorithm and hash_algorithm != algorithm:
+            raise ValueError(f"哈希算法与该上传不一致: {hash_algorithm}，应为 {algorithm}")
         
-        # 验证分片哈希（如果提供）- 使用 SHA-256
-        if chunk_hash:
-            actual_hash = hashlib.sha256(content).hexdigest()
-            if actual_hash != chunk_hash:
-                # 删除错误的分片文件
-                os.remove(chunk_file_path)
-                raise ValueError(f"分片哈希验证失败: 期望 {chunk_hash}, 实际 {actual_hash}")
+        chunk = coalesce_stream(chunk)
+        # 提供 chunkHash 时校验分片；merkle 模式下始终计算摘要，合并时不再读取分片数据
+        compute_digest = chunk_hash or self.config.hash_mode == "merkle"
+        chunk_hasher = new_hasher(algorithm) if compute_digest else None
+        # 重新上传已标记的分片：写入数据前先取消标记并删除摘要，写入中断或校验失败时该分片保持未上传，
+        # 合并时不会使用已被部分覆盖的数据，也不会使用与数据不再相符的旧摘要
+        if chunk_index in metadata.uploaded_chunks:
+            await self._store.remove_chunk(file_id, chunk_index)
+        try:
+            if metadata.chunk_size:
+                await self._write_partial_chunk(chunk, metadata, chunk_index, chunk_hasher)
+            else:
+                await self._write_chunk_file(chunk, file_id, chunk_index, chunk_hasher)
+            
+            # 验证分片哈希（如果提供）- 使用配置的哈希算法
+            digest = None
+            if chunk_hasher is not None:
+                digest = chunk_hasher.digest()
+                actual_hash = digest.hex()
+                if chunk_hash and actual_hash != chunk_hash:
+                    raise ValueError(f"分片哈希验证失败: 期望 {chunk_hash}, 实际 {actual_hash}")
+        except BaseException:
+            # 数据可能已部分写入：同一分片的并发上传可能在此期间完成了标记，一并取消；临时分片文件直接删除
+            with anyio.CancelScope(shield=True):
+                await self._store.remove_chunk(file_id, chunk_index)
+                if not metadata.chunk_size:
+                    await anyio.Path(self.config.get_chunk_file_path(file_id, chunk_index)).unlink(missing_ok=True)
+            if created:
+                await self._discard_upload(file_id, bool(metadata.chunk_size))
+            raise
         
-        # 更新元数据
-        metadata.uploaded_chunks.add(chunk_index)
+        # 更新元数据，分片摘要一并保存，供 merkle 模式合并时使用
+        metadata = await self._store.add_chunk(file_id, chunk_index, digest)
         
         return UploadResponse(
             fileId=file_id,
             chunkIndex=chunk_index,
-            uploadedChunks=list(metadata.uploaded_chunks),
+            uploadedCount=len(metadata.uploaded_chunks),
+            **(self._uploaded_chunks_fields(metadata, output_format == "bitmap") if output_format in ("list", "bitmap") else {}),
             message=f"分片 {chunk_index + 1}/{chunk_total} 上传成功"
         )
     
     async def merge_chunks(self, request: MergeRequest) -> MergeResponse:
         """
         合并分片
+
+        hashMode（未指定时使用配置的 hash_mode）为 merkle 时，使用上传时保存的分片摘要，
+        缺少的在线程池中并行计算，并在合并前完成校验；否则合并时计算整个文件的哈希
         """
-        metadata = self._file_metadata.get(request.fileId)
+        hash_mode = request.hashMode or self.config.hash_mode
+        check_hash_mode(hash_mode)
+        
+        metadata = await self._store.get(request.fileId)
         if not metadata:
             raise ValueError(f"未找到文件元数据: {request.fileId}")
+        if not metadata.chunk_size:
+            return await self._merge(request, metadata, hash_mode)
         
-        # 检查分片是否完整
-        if len(metadata.uploaded_chunks) != request.chunkTotal:
-            raise ValueError(
-                f"分片不完整: {len(metadata.uploaded_chunks)}/{request.chunkTotal}"
-            )
+        # 直接写入模式：对预分配文件加独占锁，仍有分片在写入（持有共享锁）时拒绝合并，
+        # 加锁后各 worker 都无法再写入；加锁前读取的元数据可能已过期，加锁后重新读取
+        partial_fd = await anyio.to_thread.run_sync(_lock_partial_file, self.config.get_partial_file_path(request.fileId))
+        try:
+            metadata = await self._store.get(request.fileId)
+            if not metadata:
+                raise ValueError(f"未找到文件元数据: {request.fileId}")
+            return await self._merge(request, metadata, hash_mode)
+        finally:
+            await anyio.to_thread.run_sync(os.close, partial_fd)
+    
+    async def _merge(self, request: MergeRequest, metadata: FileMetadata, hash_mode: str) -> MergeResponse:
+        """校验分片完整性和文件哈希并合并（直接写入模式下调用时已持有预分配文件的独占锁）"""
+        if request.chunkTotal != metadata.chunk_total:
+            raise ValueError(f"分片总数与该上传不一致: {request.chunkTotal}，应为 {metadata.chunk_total}")
         
-        # 检查所有分片是否存在
-        for i in range(request.chunkTotal):
-            if i not in metadata.uploaded_chunks:
-                raise ValueError(f"缺少分片: {i}")
+        # 检查分片是否完整：计数与位图一致时直接通过，否则再定位缺失的分片用于报错
+        uploaded_chunks = metadata.uploaded_chunks
+        if len(uploaded_chunks) != request.chunkTotal or not uploaded_chunks.all_set(request.chunkTotal):
+            if len(uploaded_chunks) != request.chunkTotal:
+                raise ValueError(f"分片不完整: {len(uploaded_chunks)}/{request.chunkTotal}")
+            raise ValueError(f"缺少分片: {uploaded_chunks.first_missing(request.chunkTotal)}")
+        
+        partial_path = self.config.get_partial_file_path(request.fileId)
+        if not metadata.chunk_size:
+            missing_path = await anyio.to_thread.run_sync(self._find_missing_chunk_file, request.fileId, request.chunkTotal)
+            if missing_path:
+                raise ValueError(f"分片文件不存在: {missing_path}")
+        
+        algorithm = self._hash_algorithm(metadata)
         
         # 生成目标文件路径
         file_extension = self._get_file_extension(request.fileName)
         target_filename = f"{request.fileHash}{file_extension}"
         target_path = self.config.get_upload_file_path(target_filename)
         
-        # 合并分片
-        await self._merge_chunk_files(request.fileId, target_path, request.chunkTotal)
+        # merkle 模式：合并前校验分片摘要组成的文件哈希
+        if hash_mode == "merkle":
+            stored_digests = await self._store.get_chunk_digests(request.fileId)
+            actual_hash = await self._calculate_merkle_root(metadata, request.chunkTotal, algorithm, dict(stored_digests))
+            if actual_hash != request.fileHash:
+                raise ValueError(f"文件哈希验证失败: 期望 {request.fileHash}, 实际 {actual_hash}")
+        
+        file_hasher = None
+        if metadata.chunk_size:
+            # 直接写入模式：校验预分配文件，落盘后重命名即完成合并
+            if hash_mode == "full":
+                actual_hash = await self._calculate_file_hash(partial_path, algorithm)
+                if actual_hash != request.fileHash:
+                    raise ValueError(f"文件哈希验证失败: 期望 {request.fileHash}, 实际 {actual_hash}")
+            await anyio.to_thread.run_sync(_commit_partial_file, partial_path, target_path, self.config.upload_path)
+        else:
+            # 合并分片，full 模式下合并的同时计算文件哈希，无需再读一遍合并后的文件
+            file_hasher = new_hasher(algorithm) if hash_mode == "full" else None
+            await self._merge_chunk_files(request.fileId, target_path, request.chunkTotal, file_hasher)
         
         # 验证合并后的文件哈希
-        actual_hash = await self._calculate_file_hash(target_path)
-        if actual_hash != request.fileHash:
-            # 删除错误的合并文件
-            os.remove(target_path)
-            raise ValueError(f"文件哈希验证失败: 期望 {request.fileHash}, 实际 {actual_hash}")
+        if file_hasher is not None:
+            actual_hash = file_hasher.hexdigest()
+            if actual_hash != request.fileHash:
+                # 删除错误的合并文件
+                await anyio.Path(target_path).unlink()
+                raise ValueError(f"文件哈希验证失败: 期望 {request.fileHash}, 实际 {actual_hash}")
         
-        # 清理临时文件
-        await self._cleanup_temp_files(request.fileId)
+        # merkle 模式下校验的是摘要，拼接读取的却是磁盘上的分片文件：校验之后有分片开始重新上传
+        # （写入前会先取消标记并删除摘要）时，拼接结果不可信，需重新合并
+        if hash_mode == "merkle" and not metadata.chunk_size:
+            current = await self._store.get(request.fileId)
+            if (
+                current is None
+                or not current.uploaded_chunks.all_set(request.chunkTotal)
+                or await self._store.get_chunk_digests(request.fileId) != stored_digests
+            ):
+                await anyio.Path(target_path).unlink(missing_ok=True)
+                raise ValueError("合并期间有分片被重新上传，请重新合并")
         
         # 更新哈希映射
         self._hash_to_file[request.fileHash] = target_path
         
-        # 清理元数据
-        del self._file_metadata[request.fileId]
+        # 先清理元数据再清理临时文件：之后到达的分片无法再登记，也就不会留下无人清理的分片文件
+        await self._store.delete(request.fileId)
+        await self._cleanup_temp_files(request.fileId)
         
         file_url = self.config.get_file_url(target_filename)
         
         return MergeResponse(
+            hashAlgorithm=algorithm,
+            hashMode=hash_mode,
             fileId=request.fileId,
             url=file_url,
             message="文件合并成功"
         )
     
-    async def _merge_chunk_files(self, file_id: str, target_path: str, chunk_total: int):
-        """使用aiofiles异步合并文件"""
-        async with aiofiles.open(target_path, 'wb') as target_file:
-            for i in range(chunk_total):
-                chunk_file_path = self.config.get_chunk_file_path(file_id, i)
-                if not os.path.exists(chunk_file_path):
-                    raise ValueError(f"分片文件不存在: {chunk_file_path}")
-                
-                async with aiofiles.open(chunk_file_path, 'rb') as chunk_file:
-                    content = await chunk_file.read()
-                    await target_file.write(content)
-    
-    async def _calculate_file_hash(self, file_path: str) -> str:
-        """异步计算文件SHA-256哈希"""
-        hash_sha256 = hashlib.sha256()
-        async with aiofiles.open(file_path, 'rb') as f:
-            while chunk := await f.read(8192):
-                hash_sha256.update(chunk)
-        return hash_sha256.hexdigest()
+    async def _write_chunk_file(
+        self,
+        chunk: AsyncIterable[bytes],
+        file_id: str,
+        chunk_index: int,
+        chunk_hasher
+    ) -> str:
+        """将分片保存到临时目录，返回分片文件路径"""
+        chunk_file_path = self.config.get_chunk_file_path(file_id, chunk_index)
+        try:
+            f = await anyio.open_file(chunk_file_path, 'wb')
+        except FileNotFoundError:
+            # 临时目录仅在该文件的首个分片时创建，之后的分片不再逐次 mkdir
+            await anyio.Path(self.config.get_temp_dir_path(file_id)).mkdir(parents=True, exist_ok=True)
+            f = await anyio.open_file(chunk_file_path, 'wb')
+        async with f:
+            async for data in chunk:
+                if chunk_hasher is not None:
+                    chunk_hasher.update(data)
+                await f.write(data)
+        return chunk_file_path
+    
+    async def _write_partial_chunk(
+        self,
+        chunk: AsyncIterable[bytes],
+        metadata: FileMetadata,
+        chunk_index: int,
+        chunk_hasher
+    ):
+        """按分片偏移使用 os.pwrite 直接写入预分配的文件（经由该文件的写入任务）"""
+        offset, length = self._partial_chunk_range(metadata, chunk_index)
+        end = offset + length
+        
+        async with self._partial_writer(metadata.file_id) as writer:
+            async for data in chunk:
+                if offset + len(data) > end:
+                    raise ValueError(f"分片大小超过预期: 分片 {chunk_index} 应为 {length} 字节")
+                if chunk_hasher is not None:
+                    chunk_hasher.update(data)
+                await writer.write(data, offset)
+                offset += len(data)
+        
+        if offset != end:
+            raise ValueError(f"分片大小不匹配: 分片 {chunk_index} 期望 {length} 字节, 实际 {length - (end - offset)} 字节")
+    
+    def _partial_chunk_range(self, metadata: FileMetadata, chunk_index: int) -> Tuple[int, int]:
+        """直接写入模式下分片在文件中的 (偏移, 长度)"""
+        offset = chunk_index * metadata.chunk_size
+        length = min(metadata.chunk_size, metadata.file_size - offset)
+        if chunk_index < 0 or chunk_index >= metadata.chunk_total or length <= 0:
+            raise ValueError(f"分片索引超出范围: {chunk_index}")
+        return offset, length
+    
+    @asynccontextmanager
+    async def _partial_writer(self, file_id: str) -> AsyncIterator["_PartialFileWriter"]:
+        """
+        获取直接写入模式的文件写入任务，同一文件并发上传的分片共用一个
+
+        最后一个使用者结束时即关闭文件描述符并释放共享锁，不在进程中长期持有：
+        多 worker 部署时文件可能由其他进程合并，之后到达的分片须重新打开并发现文件已不存在。
+        """
+        writer = self._partial_writers.get(file_id)
+        fd = None
+        if writer is None or writer.stopped:
+            fd = await anyio.to_thread.run_sync(_open_partial_file, self.config.get_partial_file_path(file_id))
+            # 并发的分片可能同时打开了文件，保留先登记的写入任务
+            writer = self._partial_writers.get(file_id)
+            if writer is None or writer.stopped:
+                writer = self._partial_writers[file_id] = _PartialFileWriter(fd)
+                fd = None
+        writer.users += 1
+        try:
+            if fd is not None:
+                await anyio.to_thread.run_sync(os.close, fd)
+            yield writer
+        finally:
+            writer.users -= 1
+            if writer.users == 0:
+                if self._partial_writers.get(file_id) is writer:
+                    del self._partial_writers[file_id]
+                with anyio.CancelScope(shield=True):
+                    await writer.close()
+    
+    async def _merge_chunk_files(self, file_id: str, target_path: str, chunk_total: int, file_hasher=None):
+        """
+        在线程池中拼接分片，数据由内核拷贝 (copy_file_range / sendfile)
+
+        提供 file_hasher 时，每个分片先读一遍更新哈希，随后从页缓存拷贝
+        """
+        prefix = self.config.get_chunk_path_prefix(file_id)
+        # 未执行启动事件（config.init）时上传目录可能不存在：临时目录不在上传目录下时，它不会随分片一起创建
+        await anyio.Path(self.config.upload_path).mkdir(parents=True, exist_ok=True)
+        await anyio.to_thread.run_sync(
+            concat_files, target_path, [prefix + str(i) for i in range(chunk_total)], file_hasher
+        )
+    
+    def _find_missing_chunk_file(self, file_id: str, chunk_total: int) -> Optional[str]:
+        """返回第一个不存在的分片文件路径（在线程池中调用）"""
+        prefix = self.config.get_chunk_path_prefix(file_id)
+        exists = os.path.exists
+        for i in range(chunk_total):
+            chunk_file_path = prefix + str(i)
+            if not exists(chunk_file_path):
+                return chunk_file_path
+        return None
+    
+    async def _calculate_file_hash(self, file_path: str, algorithm: str) -> str:
+        """异步计算文件哈希，整个计算在线程池中完成，不阻塞事件循环"""
+        return await anyio.to_thread.run_sync(hash_file, file_path, algorithm)
+    
+    async def _calculate_merkle_root(
+        self,
+        metadata: FileMetadata,
+        chunk_total: int,
+        algorithm: str,
+        digests: Dict[int, bytes]
+    ) -> str:
+        """
+        返回按分片顺序组合的 merkle 文件哈希
+
+        上传时已校验的分片直接使用保存的摘要 digests，其余分片在线程池中并行计算（并补入 digests）
+        """
+        loop = asyncio.get_running_loop()
+        missing = [i for i in range(chunk_total) if i not in digests]
+        if self._hash_executor is None:
+            self._hash_executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+        if metadata.chunk_size:
+            partial_path = self.config.get_partial_file_path(metadata.file_id)
+            tasks = [
+                loop.run_in_executor(
+                    self._hash_executor,
+                    partial(hash_file_range_digest, partial_path, *self._partial_chunk_range(metadata, i), algorithm)
+                )
+                for i in missing
+            ]
+        else:
+            prefix = self.config.get_chunk_path_prefix(metadata.file_id)
+            tasks = [
+                loop.run_in_executor(
+                    self._hash_executor,
+                    partial(hash_file_digest, prefix + str(i), algorithm)
+                )
+                for i in missing
+            ]
+        digests.update(zip(missing, await asyncio.gather(*tasks)))
+        return merkle_root((digests[i] for i in range(chunk_total)), algorithm)
     
     async def _cleanup_temp_files(self, file_id: str):
         """清理临时文件"""
         temp_dir_path = self.config.get_temp_dir_path(file_id)
-        if os.path.exists(temp_dir_path):
-            shutil.rmtree(temp_dir_path, ignore_errors=True)
+        await anyio.to_thread.run_sync(partial(shutil.rmtree, temp_dir_path, ignore_errors=True))
     
-    def _get_file_extension(self, filename: str) -> str:
-        """获取文件扩展名"""
-        return os.path.splitext(filename)[1] if '.' in filename else ""
+    async def _discard_upload(self, file_id: str, direct: bool):
+        """
+        首个分片失败时撤销本次创建的上传：删除元数据与预分配文件（或临时分片目录）
+
+        期间其他请求已登记分片或仍在写入（持有共享锁）时保留。尽力而为，不掩盖原始错误。
+        """
+        with anyio.CancelScope(shield=True):
+            partial_fd = None
+            try:
+                if direct:
+                    partial_fd = await anyio.to_thread.run_sync(_lock_partial_file, self.config.get_partial_file_path(file_id))
+                metadata = await self._store.get(file_id)
+                if metadata is not None and len(metadata.uploaded_chunks):
+                    return
+                await self._store.delete(file_id)
+                if direct:
+                    await anyio.Path(self.config.get_partial_file_path(file_id)).unlink(missing_ok=True)
+                else:
+                    await self._cleanup_temp_files(file_id)
+            except Exception:
+                pass
+            finally:
+                if partial_fd is not None:
+                    await anyio.to_thread.run_sync(os.close, partial_fd)
+
+    def _hash_algorithm(self, metadata: FileMetadata) -> str:
+        """上传使用的哈希算法（旧版本创建的元数据未记录算法时使用服务端配置）"""
+        return metadata.hash_algorithm or self.config.hash_algorithm
     
-    def get_file_metadata(self, file_id: str) -> Optional[FileMetadata]:
+    def _uploaded_chunks_fields(self, metadata: FileMetadata, bitmap: bool) -> dict:
+        """已上传分片的响应字段，仅在需要时才将位图展开为索引列表"""
+        if bitmap:
+            return {"uploadedBitmap": metadata.uploaded_chunks.to_base64()}
+        return {"uploadedChunks": list(metadata.uploaded_chunks)}
+    
+    @staticmethod
+    def _get_file_extension(filename: str) -> str:
+        """获取文件扩展名（最后一个 '.' 起的部分；以 '.' 开头的文件名视为无扩展名）"""
+        i = filename.rfind('.')
+        # 扩展名拼接到目标文件名中，'.' 须位于最后一个路径分隔符之后，避免带入路径
+        if i > max(filename.rfind('/'), filename.rfind('\\')) + 1:
+            return filename[i:]
+        return ""
+    
+    async def get_file_metadata(self, file_id: str) -> Optional[FileMetadata]:
         """获取文件元数据"""
-        return self._file_metadata.get(file_id)
+        return await self._store.get(file_id)
     
-    def list_uploading_files(self) -> List[FileMetadata]:
+    async def list_uploading_files(self) -> List[FileMetadata]:
         """列出正在上传的文件"""
-        return list(self._file_metadata.values()) 
\ No newline at end of file
+        return await self._store.list()
+
+
+class _PartialFileWriter:
+    """
+    直接写入模式下单个文件的写入任务
+
+    同一文件各分片的数据块进入队列，由一个任务成批取出，在一次线程池调用中依次 pwrite：
+    并发上传的分片不再各占一个线程池线程争用同一个 inode 锁，线程切换次数也随批量减少。
+    """
+
+    def __init__(self, fd: int):
+        self.fd = fd
+        # 正在使用该写入任务的请求数，降为 0 时关闭
+        self.users = 0
+        self._closed = False
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    @property
+    def stopped(self) -> bool:
+        """写入任务是否已结束（正常关闭或异常退出）"""
+        return self._task.done()
+
+    async def write(self, data: bytes, offset: int):
+        """在 offset 处写入数据，写入完成后返回（写入失败时抛出 OSError）"""
+        if self._closed:
+            raise ValueError("文件写入任务已关闭")
+        if self._task.done():
+            # 任务已退出，放入队列的数据不会再被取出
+            raise _writer_stopped_error()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((data, offset, future))
+        await future
+
+    async def close(self):
+        """写完队列中的数据后结束任务并关闭文件描述符"""
+        self._closed = True
+        self._queue.put_nowait(None)
+        try:
+            # 只等待任务结束，不重新抛出其异常：写入错误已交给各个写入请求
+            await asyncio.wait((self._task,))
+            if not self._task.cancelled():
+                self._task.exception()
+        finally:
+            await anyio.to_thread.run_sync(os.close, self.fd)
+
+    async def _run(self):
+        try:
+            await self._run_batches()
+        finally:
+            # 任务因异常或取消退出时，队列中剩余的写入以异常结束，避免请求一直等待
+            while not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is not None and not item[2].done():
+                    item[2].set_exception(_writer_stopped_error())
+
+    async def _run_batches(self):
+        while True:
+            batch = [await self._queue.get()]
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            items = [item for item in batch if item is not None]
+            if items:
+                try:
+                    errors = await anyio.to_thread.run_sync(
+                        _pwrite_batch, self.fd, [(data, offset) for data, offset, _ in items]
+                    )
+                except BaseException as e:
+                    # 任务被取消时不把 CancelledError 交给写入请求，否则看起来像是请求本身被取消
+                    error = e if isinstance(e, Exception) else _writer_stopped_error()
+                    for _, _, future in items:
+                        if not future.done():
+                            future.set_exception(error)
+                    raise
+                for (_, _, future), error in zip(items, errors):
+                    # 等待写入的请求可能已取消
+                    if future.done():
+                        continue
+                    if error is None:
+                        future.set_result(None)
+                    else:
+                        future.set_exception(error)
+            # 收到 close() 放入的 None
+            if len(items) != len(batch):
+                return
+
+
+def _writer_stopped_error() -> OSError:
+    return OSError(errno.EIO, "直接写入模式的写入任务已退出")
+
+
+def _create_partial_file(path: str, file_size: int):
+    """创建（已存在时打开）直接写入模式的文件并预分配空间"""
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o644)
+    except FileNotFoundError:
+        # 未执行启动事件（config.init）时上传目录可能不存在
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o644)
+    try:
+        if hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(fd, 0, file_size)
+                return
+            except OSError:
+                # 文件系统不支持预分配时退化为设置文件长度
+                pass
+        if os.fstat(fd).st_size < file_size:
+            os.ftruncate(fd, file_size)
+    finally:
+        os.close(fd)
+
+
+def _open_partial_file(path: str) -> int:
+    """
+    打开直接写入模式的文件用于写入分片，并加共享锁（合并时加独占锁）
+
+    文件由首个分片创建，这里不再创建：不存在说明已被合并（重命名为目标文件）。
+    打开与加锁之间文件可能被合并，加锁后确认路径仍指向同一个文件，
+    否则写入的就是已发布的目标文件。
+    """
+    try:
+        fd = os.open(path, os.O_WRONLY)
+    except FileNotFoundError:
+        raise ValueError("文件已合并或上传已取消，不能继续写入分片") from None
+    try:
+        if not try_lock(fd, exclusive=False):
+            raise ValueError("文件正在合并，不能继续写入分片")
+        st = os.fstat(fd)
+        try:
+            current = os.stat(path)
+        except FileNotFoundError:
+            current = None
+        if current is None or (current.st_dev, current.st_ino) != (st.st_dev, st.st_ino):
+            raise ValueError("文件已合并或上传已取消，不能继续写入分片")
+    except BaseException:
+        os.close(fd)
+        raise
+    return fd
+
+
+def _lock_partial_file(path: str) -> int:
+    """打开直接写入模式的文件并加独占锁，返回持有锁的文件描述符（关闭即释放）"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        raise ValueError(f"分片文件不存在: {path}") from None
+    if not try_lock(fd, exclusive=True):
+        os.close(fd)
+        raise ValueError("仍有分片正在写入，请稍后重试合并")
+    return fd
+
+
+def _fsync_path(path: str):
+    """
+    将文件刷新到磁盘
+
+    fsync 作用于 inode，其他 worker 进程通过各自描述符 pwrite 的数据也会一并落盘
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _fsync_dir(path: str):
+    """将目录项（重命名结果）刷新到磁盘，不支持对目录 fsync 的平台（如 Windows）忽略"""
+    try:
+        _fsync_path(path)
+    except OSError:
+        pass
+
+
+def _commit_partial_file(partial_path: str, target_path: str, dir_path: str):
+    """将直接写入模式的文件落盘后重命名为目标文件，并刷新目录项（一次线程池调用完成）"""
+    _fsync_path(partial_path)
+    os.replace(partial_path, target_path)
+    _fsync_dir(dir_path)
+
+
+def _pwrite_all(fd: int, data: bytes, offset: int):
+    """在指定偏移写入全部数据（os.pwrite 可能只写入一部分）"""
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view = view[written:]
+        offset += written
+
+
+def _pwrite_batch(fd: int, items: List[tuple]) -> List[Optional[OSError]]:
+    """依次写入 (data, offset)，返回每一项的错误（成功为 None），一项失败不影响其他分片"""
+    errors: List[Optional[OSError]] = []
+    for data, offset in items:
+        try:
+            _pwrite_all(fd, data, offset)
+            errors.append(None)
+        except OSError as e:
+            errors.append(e)
+    return errors
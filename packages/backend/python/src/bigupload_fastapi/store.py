@@ -0,0 +1,655 @@
+"""
+Metadata stores for BigUpload FastAPI package
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import anyio
+import anyio.to_thread
+
+from .metadata import ChunkBitmap, FileMetadata, UploadStatus, set_chunk_digest
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # 可选依赖: pip install bigupload-fastapi[redis]
+    aioredis = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+# Redis 位图中分片 i 为第 i>>3 字节的最高位起第 i&7 位，与 ChunkBitmap 的位序相反，加载时逐字节翻转
+_REVERSE_BITS = bytes(int(f"{byte:08b}"[::-1], 2) for byte in range(256))
+
+
+class MetadataStore:
+    """
+    文件元数据存储接口
+
+    UploadService 通过该接口读写上传元数据，默认使用进程内存储；
+    多进程部署（uvicorn --workers N）时需使用共享存储，如 SQLiteMetadataStore 或 RedisMetadataStore。
+    """
+
+    async def init(self):
+        """应用启动时调用，用于建立连接或恢复数据（默认无操作）"""
+
+    async def get(self, file_id: str) -> Optional[FileMetadata]:
+        """获取文件元数据"""
+        raise NotImplementedError
+
+    async def create(self, metadata: FileMetadata) -> FileMetadata:
+        """创建文件元数据，已存在时返回已有的元数据"""
+        raise NotImplementedError
+
+    async def add_chunk(self, file_id: str, chunk_index: int, digest: Optional[bytes] = None) -> FileMetadata:
+        """
+        记录已上传的分片及其摘要（未计算摘要时为 None），返回更新后的元数据
+
+        元数据不存在（如文件已合并）时抛出 ValueError
+        """
+        raise NotImplementedError
+
+    async def remove_chunk(self, file_id: str, chunk_index: int):
+        """
+        取消分片的已上传标记并删除其摘要（元数据不存在时忽略）
+
+        分片重新上传时在写入数据前调用：写入中断或校验失败时该分片保持未上传，
+        合并不会使用已被部分覆盖的数据，也不会使用与数据不再相符的旧摘要。
+        """
+        raise NotImplementedError
+
+    async def get_chunk_digests(self, file_id: str) -> Dict[int, bytes]:
+        """获取已记录的分片摘要"""
+        raise NotImplementedError
+
+    async def find_by_hash(self, file_hash: str) -> Optional[FileMetadata]:
+        """按文件哈希查找未完成的上传"""
+        raise NotImplementedError
+
+    async def delete(self, file_id: str):
+        """删除文件元数据"""
+        raise NotImplementedError
+
+    async def list(self) -> List[FileMetadata]:
+        """列出所有文件元数据"""
+        raise NotImplementedError
+
+
+class MemoryMetadataStore(MetadataStore):
+    """进程内元数据存储（仅适用于单进程部署）"""
+
+    def __init__(self):
+        self._file_metadata: Dict[str, FileMetadata] = {}
+        # 文件哈希 -> 使用该哈希的 file_id（按创建顺序），find_by_hash 无需遍历所有上传
+        self._hash_to_file_ids: Dict[str, Dict[str, None]] = {}
+
+    async def get(self, file_id: str) -> Optional[FileMetadata]:
+        return self._file_metadata.get(file_id)
+
+    async def create(self, metadata: FileMetadata) -> FileMetadata:
+        return self._add(metadata)
+
+    async def add_chunk(self, file_id: str, chunk_index: int, digest: Optional[bytes] = None) -> FileMetadata:
+        metadata = self._get_existing(file_id)
+        metadata.uploaded_chunks.add(chunk_index)
+        set_chunk_digest(metadata, chunk_index, digest)
+        return metadata
+
+    async def remove_chunk(self, file_id: str, chunk_index: int):
+        metadata = self._file_metadata.get(file_id)
+        if metadata is not None:
+            metadata.uploaded_chunks.discard(chunk_index)
+            metadata.chunk_digests.pop(chunk_index, None)
+
+    async def get_chunk_digests(self, file_id: str) -> Dict[int, bytes]:
+        metadata = self._file_metadata.get(file_id)
+        return dict(metadata.chunk_digests) if metadata else {}
+
+    async def find_by_hash(self, file_hash: str) -> Optional[FileMetadata]:
+        file_ids = self._hash_to_file_ids.get(file_hash)
+        return self._file_metadata[next(iter(file_ids))] if file_ids else None
+
+    async def delete(self, file_id: str):
+        self._remove(file_id)
+
+    async def list(self) -> List[FileMetadata]:
+        return list(self._file_metadata.values())
+
+    def _get_existing(self, file_id: str) -> FileMetadata:
+        metadata = self._file_metadata.get(file_id)
+        if metadata is None:
+            raise ValueError(f"未找到文件元数据: {file_id}")
+        return metadata
+
+    def _add(self, metadata: FileMetadata) -> FileMetadata:
+        """登记元数据（已存在时返回已有的元数据）并维护哈希索引"""
+        existing = self._file_metadata.setdefault(metadata.file_id, metadata)
+        if existing is metadata:
+            self._hash_to_file_ids.setdefault(metadata.file_hash, {})[metadata.file_id] = None
+        return existing
+
+    def _remove(self, file_id: str):
+        """移除元数据并维护哈希索引"""
+        metadata = self._file_metadata.pop(file_id, None)
+        if metadata is None:
+            return
+        file_ids = self._hash_to_file_ids.get(metadata.file_hash)
+        if file_ids is not None:
+            file_ids.pop(file_id, None)
+            if not file_ids:
+                del self._hash_to_file_ids[metadata.file_hash]
+
+
+class LogMetadataStore(MemoryMetadataStore):
+    """
+    进程内元数据存储 + 追加日志（崩溃恢复）
+
+    元数据仍在内存中更新；每个文件在 log_dir 下维护一个 {file_id}.log，
+    首行为文件信息（JSON），之后每完成一个分片追加一行分片索引（有摘要时后接十六进制摘要），
+    分片重新上传前追加一行 "-分片索引" 取消其标记。
+    日志以 O_APPEND | O_DSYNC 打开，写入即落盘，无需逐次 fsync 或序列化整个元数据。
+    进程重启后 init() 读取所有日志重建元数据（无法解析的日志加 .corrupt 后缀移到一旁）；合并完成后删除日志。
+    仅适用于单进程部署。
+    """
+
+    LOG_SUFFIX = ".log"
+    CORRUPT_SUFFIX = ".corrupt"
+
+    def __init__(self, log_dir: str):
+        """
+        Args:
+            log_dir: 日志目录（可与临时分片目录相同）
+        """
+        super().__init__()
+        self.log_dir = log_dir
+        self._log_prefix = os.path.join(log_dir, "")
+        # 各文件日志的文件描述符，创建元数据时异步打开
+        self._log_fds: Dict[str, asyncio.Future] = {}
+        self._loaded = False
+
+    async def init(self):
+        """读取日志目录，恢复进程退出前未完成的上传"""
+        if self._loaded:
+            return
+        self._loaded = True
+        loop = asyncio.get_running_loop()
+        for metadata, fd in await anyio.to_thread.run_sync(self._recover):
+            self._add(metadata)
+            future = self._log_fds[metadata.file_id] = loop.create_future()
+            future.set_result(fd)
+
+    async def create(self, metadata: FileMetadata) -> FileMetadata:
+        existing = self._add(metadata)
+        if existing is metadata:
+            # 先登记 future，并发的 add_chunk 等待日志首行写入后再追加
+            future = self._log_fds[metadata.file_id] = asyncio.get_running_loop().create_future()
+            try:
+                future.set_result(await anyio.to_thread.run_sync(self._open_log, metadata))
+            except BaseException as e:
+                future.set_exception(e)
+                self._log_fds.pop(metadata.file_id, None)
+                self._remove(metadata.file_id)
+                raise
+        return existing
+
+    async def add_chunk(self, file_id: str, chunk_index: int, digest: Optional[bytes] = None) -> FileMetadata:
+        metadata = self._get_existing(file_id)
+        if chunk_index not in metadata.uploaded_chunks or metadata.chunk_digests.get(chunk_index) != digest:
+            fd = await self._log_fds[file_id]
+            line = b"%d %s\n" % (chunk_index, digest.hex().encode("ascii")) if digest else b"%d\n" % chunk_index
+            await anyio.to_thread.run_sync(os.write, fd, line)
+            metadata.uploaded_chunks.add(chunk_index)
+            set_chunk_digest(metadata, chunk_index, digest)
+        return metadata
+
+    async def remove_chunk(self, file_id: str, chunk_index: int):
+        metadata = self._file_metadata.get(file_id)
+        if metadata is not None and chunk_index in metadata.uploaded_chunks:
+            fd = await self._log_fds[file_id]
+            await anyio.to_thread.run_sync(os.write, fd, b"-%d\n" % chunk_index)
+            metadata.uploaded_chunks.discard(chunk_index)
+            metadata.chunk_digests.pop(chunk_index, None)
+
+    async def delete(self, file_id: str):
+        self._remove(file_id)
+        future = self._log_fds.pop(file_id, None)
+        if future is not None and future.done() and not future.exception():
+            await anyio.to_thread.run_sync(self._remove_log, file_id, future.result())
+
+    def _log_path(self, file_id: str) -> str:
+        return self._log_prefix + file_id + self.LOG_SUFFIX
+
+    def _open_fd(self, path: str, flags: int = 0) -> int:
+        return os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND | getattr(os, "O_DSYNC", 0) | flags, 0o644)
+
+    def _open_log(self, metadata: FileMetadata) -> int:
+        Path(self.log_dir).mkdir(parents=True, exist_ok=True)
+        fd = self._open_fd(self._log_path(metadata.file_id), os.O_TRUNC)
+        header = {
+            "fileId": metadata.file_id,
+            "fileName": metadata.file_name,
+            "fileHash": metadata.file_hash,
+            "chunkTotal": metadata.chunk_total,
+            "fileSize": metadata.file_size,
+            "chunkSize": metadata.chunk_size,
+            "hashAlgorithm": metadata.hash_algorithm,
+        }
+        os.write(fd, json.dumps(header, ensure_ascii=False).encode("utf-8") + b"\n")
+        return fd
+
+    def _remove_log(self, file_id: str, fd: int):
+        os.close(fd)
+        try:
+            os.unlink(self._log_path(file_id))
+        except FileNotFoundError:
+            pass
+
+    def _recover(self) -> List[tuple]:
+        if not os.path.isdir(self.log_dir):
+            return []
+        recovered = []
+        for entry in os.scandir(self.log_dir):
+            if not entry.name.endswith(self.LOG_SUFFIX) or not entry.is_file():
+                continue
+            with open(entry.path, "rb") as f:
+                data = f.read()
+            # 以换行结尾的行才是完整写入的记录，最后一段可能因崩溃未写完整：
+            # 截断到最后一个完整行，否则之后追加的记录会接在这段残缺数据后面
+            end = data.rfind(b"\n") + 1
+            if end < len(data):
+                os.truncate(entry.path, end)
+            lines = data[:end].split(b"\n")[:-1]
+            if not lines:
+                continue
+            try:
+                metadata = self._parse_log(lines)
+            except (ValueError, KeyError, TypeError) as e:
+                # 无法解析的日志移到一旁保留，不影响其他上传的恢复
+                logger.warning("无法解析上传日志 %s，已忽略: %s", entry.path, e)
+                os.replace(entry.path, entry.path + self.CORRUPT_SUFFIX)
+                continue
+            recovered.append((metadata, self._open_fd(entry.path)))
+        return recovered
+
+    @staticmethod
+    def _parse_log(lines: List[bytes]) -> FileMetadata:
+        header = json.loads(lines[0])
+        metadata = FileMetadata(
+            file_id=header["fileId"],
+            file_name=header["fileName"],
+            file_hash=header["fileHash"],
+            chunk_total=header["chunkTotal"],
+            file_size=header.get("fileSize", 0),
+            chunk_size=header.get("chunkSize", 0),
+            hash_algorithm=header.get("hashAlgorithm", "")
+        )
+        for line in lines[1:]:
+            if line.startswith(b"-"):
+                # 分片重新上传前取消的标记
+                metadata.uploaded_chunks.discard(int(line[1:]))
+                metadata.chunk_digests.pop(int(line[1:]), None)
+                continue
+            chunk_index, _, digest = line.partition(b" ")
+            index = int(chunk_index)
+            if not 0 <= index < metadata.chunk_total:
+                raise ValueError(f"分片索引超出范围: {index}")
+            metadata.uploaded_chunks.add(index)
+            set_chunk_digest(metadata, index, bytes.fromhex(digest.decode("ascii")) if digest else None)
+        return metadata
+
+
+class SQLiteMetadataStore(MetadataStore):
+    """
+    基于 SQLite (WAL) 的元数据存储
+
+    多个 worker 进程共享同一个数据库文件，断点续传/状态查询不再依赖请求落在同一进程。
+    所有数据库操作在线程池中执行，不阻塞事件循环。
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS uploads (
+            file_id TEXT PRIMARY KEY,
+            file_name TEXT NOT NULL,
+            file_hash TEXT NOT NULL,
+            chunk_total INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            uploaded_chunks BLOB NOT NULL,
+            file_size INTEGER NOT NULL DEFAULT 0,
+            chunk_size INTEGER NOT NULL DEFAULT 0,
+            hash_algorithm TEXT NOT NULL DEFAULT ''
+        );
+        CREATE INDEX IF NOT EXISTS idx_uploads_file_hash ON uploads (file_hash);
+        CREATE TABLE IF NOT EXISTS chunk_digests (
+            file_id TEXT NOT NULL,
+            chunk_index INTEGER NOT NULL,
+            digest BLOB NOT NULL,
+            PRIMARY KEY (file_id, chunk_index)
+        );
+    """
+
+    def __init__(self, db_path: str):
+        """
+        Args:
+            db_path: 数据库文件路径
+        """
+        self.db_path = db_path
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+        self._migrate()
+
+    async def get(self, file_id: str) -> Optional[FileMetadata]:
+        return await anyio.to_thread.run_sync(self._get, file_id)
+
+    async def create(self, metadata: FileMetadata) -> FileMetadata:
+        return await anyio.to_thread.run_sync(self._create, metadata)
+
+    async def add_chunk(self, file_id: str, chunk_index: int, digest: Optional[bytes] = None) -> FileMetadata:
+        return await anyio.to_thread.run_sync(self._add_chunk, file_id, chunk_index, digest)
+
+    async def remove_chunk(self, file_id: str, chunk_index: int):
+        await anyio.to_thread.run_sync(self._remove_chunk, file_id, chunk_index)
+
+    async def get_chunk_digests(self, file_id: str) -> Dict[int, bytes]:
+        return await anyio.to_thread.run_sync(self._get_chunk_digests, file_id)
+
+    async def find_by_hash(self, file_hash: str) -> Optional[FileMetadata]:
+        return await anyio.to_thread.run_sync(self._find_by_hash, file_hash)
+
+    async def delete(self, file_id: str):
+        await anyio.to_thread.run_sync(self._delete, file_id)
+
+    async def list(self) -> List[FileMetadata]:
+        return await anyio.to_thread.run_sync(self._list)
+
+    def _migrate(self):
+        """为旧版本创建的数据库补齐新增的列"""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(uploads)")}
+        for column, definition in (
+            ("file_size", "INTEGER NOT NULL DEFAULT 0"),
+            ("chunk_size", "INTEGER NOT NULL DEFAULT 0"),
+            ("hash_algorithm", "TEXT NOT NULL DEFAULT ''"),
+        ):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE uploads ADD COLUMN {column} {definition}")
+
+    def _execute(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _load(self, row: tuple) -> FileMetadata:
+        metadata = FileMetadata(
+            file_id=row[0], file_name=row[1], file_hash=row[2], chunk_total=row[3],
+            file_size=row[6], chunk_size=row[7], hash_algorithm=row[8]
+        )
+        metadata.status = UploadStatus(row[4])
+        metadata.uploaded_chunks = ChunkBitmap(data=row[5])
+        return metadata
+
+    def _get(self, file_id: str) -> Optional[FileMetadata]:
+        rows = self._execute("SELECT * FROM uploads WHERE file_id = ?", (file_id,))
+        return self._load(rows[0]) if rows else None
+
+    def _create(self, metadata: FileMetadata) -> FileMetadata:
+        self._execute(
+            "INSERT OR IGNORE INTO uploads "
+            "(file_id, file_name, file_hash, chunk_total, status, uploaded_chunks, file_size, chunk_size, hash_algorithm) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (metadata.file_id, metadata.file_name, metadata.file_hash, metadata.chunk_total, metadata.status,
+             metadata.uploaded_chunks.to_bytes(), metadata.file_size, metadata.chunk_size, metadata.hash_algorithm)
+        )
+        # 已存在时返回已有的元数据；插入后被其他进程立即删除时退回本次创建的元数据
+        return self._get(metadata.file_id) or metadata
+
+    def _add_chunk(self, file_id: str, chunk_index: int, digest: Optional[bytes]) -> FileMetadata:
+        # 读-改-写位图，BEGIN IMMEDIATE 保证多进程并发写入时不丢失更新
+        with self._lock:
+            with self._conn:
+                self._conn.execute("BEGIN IMMEDIATE")
+                row = self._conn.execute("SELECT * FROM uploads WHERE file_id = ?", (file_id,)).fetchone()
+                if row is None:
+                    raise ValueError(f"未找到文件元数据: {file_id}")
+                metadata = self._load(row)
+                metadata.uploaded_chunks.add(chunk_index)
+                self._conn.execute(
+                    "UPDATE uploads SET uploaded_chunks = ? WHERE file_id = ?",
+                    (metadata.uploaded_chunks.to_bytes(), file_id)
+                )
+                if digest:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO chunk_digests (file_id, chunk_index, digest) VALUES (?, ?, ?)",
+                        (file_id, chunk_index, digest)
+                    )
+                else:
+                    self._conn.execute(
+                        "DELETE FROM chunk_digests WHERE file_id = ? AND chunk_index = ?", (file_id, chunk_index)
+                    )
+        return metadata
+
+    def _remove_chunk(self, file_id: str, chunk_index: int):
+        with self._lock:
+            with self._conn:
+                self._conn.execute("BEGIN IMMEDIATE")
+                row = self._conn.execute("SELECT * FROM uploads WHERE file_id = ?", (file_id,)).fetchone()
+                if row is None:
+                    return
+                metadata = self._load(row)
+                if chunk_index in metadata.uploaded_chunks:
+                    metadata.uploaded_chunks.discard(chunk_index)
+                    self._conn.execute(
+                        "UPDATE uploads SET uploaded_chunks = ? WHERE file_id = ?",
+                        (metadata.uploaded_chunks.to_bytes(), file_id)
+                    )
+                self._conn.execute(
+                    "DELETE FROM chunk_digests WHERE file_id = ? AND chunk_index = ?", (file_id, chunk_index)
+                )
+
+    def _get_chunk_digests(self, file_id: str) -> Dict[int, bytes]:
+        rows = self._execute("SELECT chunk_index, digest FROM chunk_digests WHERE file_id = ?", (file_id,))
+        return {chunk_index: digest for chunk_index, digest in rows}
+
+    def _find_by_hash(self, file_hash: str) -> Optional[FileMetadata]:
+        # 与进程内存储一致返回最早创建的上传；索引中相同 file_hash 的条目按 rowid 排列，无需额外排序
+        rows = self._execute("SELECT * FROM uploads WHERE file_hash = ? ORDER BY rowid LIMIT 1", (file_hash,))
+        return self._load(rows[0]) if rows else None
+
+    def _delete(self, file_id: str):
+        with self._lock:
+            with self._conn:
+                self._conn.execute("BEGIN IMMEDIATE")
+                self._conn.execute("DELETE FROM uploads WHERE file_id = ?", (file_id,))
+                self._conn.execute("DELETE FROM chunk_digests WHERE file_id = ?", (file_id,))
+
+    def _list(self) -> List[FileMetadata]:
+        return [self._load(row) for row in self._execute("SELECT * FROM uploads")]
+
+
+class RedisMetadataStore(MetadataStore):
+    """
+    基于 Redis 的元数据存储
+
+    多个 worker 进程/多台机器共享同一个 Redis，服务可水平扩展。每个上传对应：
+    - {prefix}upload:{file_id}   HASH，文件信息
+    - {prefix}bits:{file_id}     已上传分片位图（SETBIT 置位）
+    - {prefix}digests:{file_id}  HASH，分片索引 -> 分片摘要
+    - {prefix}hash:{file_hash}   ZSET，使用该文件哈希的 file_id，按创建顺序（{prefix}seq 递增序号）排序
+    创建、记录分片、删除均由一个 Lua 脚本原子完成，每次只需一次往返。
+    脚本按前缀拼接键名，需使用单机/主从 Redis（不支持 Redis Cluster）。
+    """
+
+    # 不存在时创建，返回（已有或新建的）文件信息与位图
+    CREATE_SCRIPT = """
+        if redis.call('EXISTS', KEYS[1]) == 0 then
+            redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+            redis.call('ZADD', KEYS[2], redis.call('INCR', KEYS[4]), ARGV[1])
+        end
+        return {redis.call('HGETALL', KEYS[1]), redis.call('GET', KEYS[3])}
+    """
+    # 置位并记录（或清除）分片摘要，返回更新后的文件信息与位图
+    ADD_CHUNK_SCRIPT = """
+        if redis.call('EXISTS', KEYS[1]) == 0 then
+            return nil
+        end
+        redis.call('SETBIT', KEYS[2], ARGV[1], 1)
+        if ARGV[2] ~= '' then
+            redis.call('HSET', KEYS[3], ARGV[1], ARGV[2])
+        else
+            redis.call('HDEL', KEYS[3], ARGV[1])
+        end
+        return {redis.call('HGETALL', KEYS[1]), redis.call('GET', KEYS[2])}
+    """
+    # 清除分片位并删除其摘要
+    REMOVE_CHUNK_SCRIPT = """
+        if redis.call('EXISTS', KEYS[1]) == 1 then
+            redis.call('SETBIT', KEYS[2], ARGV[1], 0)
+            redis.call('HDEL', KEYS[3], ARGV[1])
+        end
+    """
+    # 按文件哈希取最早创建的未完成上传（与其他存储一致）
+    FIND_SCRIPT = """
+        local file_id = redis.call('ZRANGE', KEYS[1], 0, 0)[1]
+        if not file_id then
+            return nil
+        end
+        return {file_id, redis.call('HGETALL', ARGV[1] .. 'upload:' .. file_id), redis.call('GET', ARGV[1] .. 'bits:' .. file_id)}
+    """
+    DELETE_SCRIPT = """
+        local file_hash = redis.call('HGET', KEYS[1], 'file_hash')
+        if file_hash then
+            redis.call('ZREM', ARGV[1] .. 'hash:' .. file_hash, ARGV[2])
+        end
+        redis.call('DEL', KEYS[1], KEYS[2], KEYS[3])
+    """
+
+    def __init__(self, url: str = "redis://localhost:6379/0", prefix: str = "bigupload:", client=None):
+        """
+        Args:
+            url: Redis 连接地址
+            prefix: 键名前缀
+            client: 已创建的 redis.asyncio.Redis 客户端（提供时忽略 url）
+        """
+        if client is None:
+            if aioredis is None:
+                raise ValueError("使用 RedisMetadataStore 需要安装可选依赖: pip install bigupload-fastapi[redis]")
+            client = aioredis.Redis.from_url(url)
+        self.prefix = prefix
+        self._redis = client
+        self._create_script = client.register_script(self.CREATE_SCRIPT)
+        self._add_chunk_script = client.register_script(self.ADD_CHUNK_SCRIPT)
+        self._remove_chunk_script = client.register_script(self.REMOVE_CHUNK_SCRIPT)
+        self._find_script = client.register_script(self.FIND_SCRIPT)
+        self._delete_script = client.register_script(self.DELETE_SCRIPT)
+
+    async def init(self):
+        """应用启动时检查 Redis 连接"""
+        await self._redis.ping()
+
+    async def get(self, file_id: str) -> Optional[FileMetadata]:
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.hgetall(self._key("upload:", file_id))
+            pipe.get(self._key("bits:", file_id))
+            fields, bits = await pipe.execute()
+        return self._load(file_id, fields, bits) if fields else None
+
+    async def create(self, metadata: FileMetadata) -> FileMetadata:
+        fields, bits = await self._create_script(
+            keys=[
+                self._key("upload:", metadata.file_id),
+                self._key("hash:", metadata.file_hash),
+                self._key("bits:", metadata.file_id),
+                self.prefix + "seq",
+            ],
+            args=[
+                metadata.file_id,
+                "file_name", metadata.file_name,
+                "file_hash", metadata.file_hash,
+                "chunk_total", metadata.chunk_total,
+                "status", metadata.status.value,
+                "file_size", metadata.file_size,
+                "chunk_size", metadata.chunk_size,
+                "hash_algorithm", metadata.hash_algorithm,
+            ]
+        )
+        return self._load(metadata.file_id, fields, bits)
+
+    async def add_chunk(self, file_id: str, chunk_index: int, digest: Optional[bytes] = None) -> FileMetadata:
+        result = await self._add_chunk_script(
+            keys=[self._key("upload:", file_id), self._key("bits:", file_id), self._key("digests:", file_id)],
+            args=[chunk_index, digest or b""]
+        )
+        if result is None:
+            raise ValueError(f"未找到文件元数据: {file_id}")
+        return self._load(file_id, *result)
+
+    async def remove_chunk(self, file_id: str, chunk_index: int):
+        await self._remove_chunk_script(
+            keys=[self._key("upload:", file_id), self._key("bits:", file_id), self._key("digests:", file_id)],
+            args=[chunk_index]
+        )
+
+    async def get_chunk_digests(self, file_id: str) -> Dict[int, bytes]:
+        digests = await self._redis.hgetall(self._key("digests:", file_id))
+        return {int(chunk_index): digest for chunk_index, digest in digests.items()}
+
+    async def find_by_hash(self, file_hash: str) -> Optional[FileMetadata]:
+        result = await self._find_script(keys=[self._key("hash:", file_hash)], args=[self.prefix])
+        if not result or not result[1]:
+            return None
+        file_id, fields, bits = result
+        return self._load(file_id.decode(), fields, bits)
+
+    async def delete(self, file_id: str):
+        await self._delete_script(
+            keys=[self._key("upload:", file_id), self._key("bits:", file_id), self._key("digests:", file_id)],
+            args=[self.prefix, file_id]
+        )
+
+    async def list(self) -> List[FileMetadata]:
+        upload_prefix = self._key("upload:", "")
+        file_ids = [key[len(upload_prefix):].decode() async for key in self._redis.scan_iter(match=upload_prefix + "*")]
+        if not file_ids:
+            return []
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for file_id in file_ids:
+                pipe.hgetall(self._key("upload:", file_id))
+                pipe.get(self._key("bits:", file_id))
+            results = await pipe.execute()
+        return [
+            self._load(file_id, fields, bits)
+            for file_id, fields, bits in zip(file_ids, results[::2], results[1::2])
+            if fields
+        ]
+
+    def _key(self, kind: str, name: str) -> str:
+        return self.prefix + kind + name
+
+    @staticmethod
+    def _pairs(fields) -> Dict[bytes, bytes]:
+        """Lua 返回的 HGETALL 结果为 [field, value, ...] 列表"""
+        if isinstance(fields, dict):
+            return fields
+        return dict(zip(fields[::2], fields[1::2]))
+
+    def _load(self, file_id: str, fields, bits: Optional[bytes]) -> FileMetadata:
+        fields = self._pairs(fields)
+        metadata = FileMetadata(
+            file_id=file_id,
+            file_name=fields[b"file_name"].decode(),
+            file_hash=fields[b"file_hash"].decode(),
+            chunk_total=int(fields[b"chunk_total"]),
+            file_size=int(fields.get(b"file_size", 0)),
+            chunk_size=int(fields.get(b"chunk_size", 0)),
+            hash_algorithm=fields.get(b"hash_algorithm", b"").decode()
+        )
+        metadata.status = UploadStatus(fields[b"status"].decode())
+        if bits:
+            metadata.uploaded_chunks = ChunkBitmap(data=bits.translate(_REVERSE_BITS))
+        return metadata
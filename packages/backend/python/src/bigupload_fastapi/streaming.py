@@ -0,0 +1,244 @@
+"""
+Streaming request body helpers for BigUpload FastAPI package
+"""
+
+from collections import deque
+from tempfile import SpooledTemporaryFile
+from typing import AsyncIterable, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+import anyio
+import anyio.to_thread
+from starlette.requests import Request
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header  # type: ignore[no-redef,import-untyped]
+
+# 分片在字段之前到达时，内存中暂存的最大字节数（超过后落盘）
+SPOOL_MAX_SIZE = 1024 * 1024  # 1MB
+# 从暂存文件读取分片时的块大小
+SPOOL_READ_SIZE = 1024 * 1024  # 1MB
+# 写入磁盘/计算哈希时合并后的块大小
+WRITE_BLOCK_SIZE = 1024 * 1024  # 1MB
+# 单个非分片字段的最大字节数（与 Starlette 表单解析的默认限制一致）
+MAX_FIELD_SIZE = 1024 * 1024  # 1MB
+# 非分片字段的最大数量（与 Starlette 表单解析的默认限制一致）
+MAX_FIELDS = 1000
+# 单个 part 头部的最大字节数
+MAX_HEADER_SIZE = 16 * 1024  # 16KB
+
+
+async def limit_stream(stream: AsyncIterator[bytes], max_size: int = 0) -> AsyncIterator[bytes]:
+    """逐块产出请求体，超过 max_size（大于0时）抛出 ValueError"""
+    size = 0
+    async for data in stream:
+        size += len(data)
+        if max_size > 0 and size > max_size:
+            raise ValueError(f"分片大小超过限制: {size} > {max_size}")
+        if data:
+            yield data
+
+
+async def coalesce_stream(stream: AsyncIterable[bytes], block_size: int = WRITE_BLOCK_SIZE) -> AsyncIterator[bytes]:
+    """
+    将网络接收的小块合并为至少 block_size 字节的块再产出（最后一块除外）
+
+    每块只需一次线程池写入和一次哈希更新；内存占用不超过约 2 * block_size。
+    """
+    parts: List[bytes] = []
+    size = 0
+    async for data in stream:
+        if not parts and len(data) >= block_size:
+            yield data
+            continue
+        parts.append(data)
+        size += len(data)
+        if size >= block_size:
+            # join 与原先追加到 bytearray 一样只复制一次，产出的是不可变的 bytes
+            yield b"".join(parts)
+            parts = []
+            size = 0
+    if parts:
+        yield b"".join(parts)
+
+
+class MultipartChunkReader:
+    """
+    流式解析分片上传请求
+
+    直接消费 request.stream()，分片数据按网络接收的粒度产出，
+    不经过 UploadFile / SpooledTemporaryFile 缓冲整个分片。
+    客户端应先发送表单字段、最后发送分片，这样在分片数据到达前即可确定写入位置；
+    分片先于字段到达时，回退为暂存到 SpooledTemporaryFile。
+    """
+
+    def __init__(self, request: Request, file_field: str = "chunk", max_size: int = 0):
+        """
+        Args:
+            request: 请求对象
+            file_field: 分片数据所在的表单字段名
+            max_size: 分片最大字节数，0表示不限制
+        """
+        _, params = parse_options_header(request.headers.get("content-type", ""))
+        boundary = params.get(b"boundary")
+        if not boundary:
+            raise ValueError("请求不是有效的 multipart/form-data")
+
+        self.fields: Dict[str, str] = {}
+        self._file_field = file_field
+        self._max_size = max_size
+        self._stream = request.stream()
+        self._pending: List[Tuple[str, bytes]] = []
+        # 已解析、尚未随事件交付的字段；交付时才写入 fields，使 fields 只反映已读取位置之前的字段
+        self._parsed_fields: Deque[Tuple[str, str]] = deque()
+        self._events = self._iter_events()
+
+        self._header_field = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._part_name: Optional[str] = None
+        self._part_is_file = False
+        self._part_data = bytearray()
+        self._header_size = 0
+        self._field_count = 0
+
+        self._parser = MultipartParser(boundary, callbacks={
+            "on_part_begin": self._on_part_begin,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+        })
+
+    async def read_until_file(self) -> bool:
+        """读取表单字段直到分片数据开始，返回是否找到分片"""
+        async for event, _ in self._events:
+            if event == "file_start":
+                return True
+        return False
+
+    async def iter_file(self) -> AsyncIterator[bytes]:
+        """
+        逐块产出分片数据，需在 read_until_file 返回 True 之后调用
+
+        分片结束后继续读完请求体，分片之后出现的表单字段抛出 ValueError：
+        调用方在分片数据到达前已根据字段确定了写入方式，不能忽略之后才到达的字段（如 chunkHash）。
+        """
+        async for data in self._iter_file_data():
+            yield data
+        async for event, data in self._events:
+            if event == "field":
+                raise ValueError(f"表单字段 {data.decode('utf-8')} 位于分片之后，请将分片放在最后一个字段")
+
+    async def _iter_file_data(self) -> AsyncIterator[bytes]:
+        size = 0
+        async for event, data in self._events:
+            if event == "file_end":
+                return
+            size += len(data)
+            if self._max_size > 0 and size > self._max_size:
+                raise ValueError(f"分片大小超过限制: {size} > {self._max_size}")
+            yield data
+
+    async def spool_file(self) -> AsyncIterator[bytes]:
+        """
+        将分片暂存后读取剩余字段，返回暂存分片的读取迭代器
+
+        用于分片先于表单字段到达的请求。
+        """
+        spooled = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        try:
+            async for data in self._iter_file_data():
+                await anyio.to_thread.run_sync(spooled.write, data)
+            await self.read_remaining()
+            spooled.seek(0)
+        except BaseException:
+            spooled.close()
+            raise
+        return self._iter_spooled(spooled)
+
+    async def read_remaining(self):
+        """读取剩余的表单字段"""
+        async for _ in self._events:
+            pass
+
+    async def _iter_spooled(self, spooled: SpooledTemporaryFile) -> AsyncIterator[bytes]:
+        with spooled:
+            while data := await anyio.to_thread.run_sync(spooled.read, SPOOL_READ_SIZE):
+                yield data
+
+    async def _iter_events(self) -> AsyncIterator[Tuple[str, bytes]]:
+        async for data in self._stream:
+            if data:
+                self._parser.write(data)
+            pending, self._pending = self._pending, []
+            for event in pending:
+                yield self._deliver(event)
+        self._parser.finalize()
+        pending, self._pending = self._pending, []
+        for event in pending:
+            yield self._deliver(event)
+
+    def _deliver(self, event: Tuple[str, bytes]) -> Tuple[str, bytes]:
+        if event[0] == "field":
+            name, value = self._parsed_fields.popleft()
+            self.fields[name] = value
+        return event
+
+    def _on_part_begin(self):
+        self._header_size = 0
+        self._disposition = b""
+        self._part_name = None
+        self._part_is_file = False
+        self._part_data = bytearray()
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self._part_is_file:
+            self._pending.append(("file_data", data[start:end]))
+        else:
+            if len(self._part_data) + end - start > MAX_FIELD_SIZE:
+                raise ValueError(f"表单字段 {self._part_name} 超过大小限制: {MAX_FIELD_SIZE} 字节")
+            self._part_data += data[start:end]
+
+    def _on_part_end(self):
+        if self._part_is_file:
+            self._pending.append(("file_end", b""))
+        elif self._part_name is not None:
+            self._parsed_fields.append((self._part_name, self._part_data.decode("utf-8")))
+            self._pending.append(("field", self._part_name.encode("utf-8")))
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+        self._add_header_size(end - start)
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+        self._add_header_size(end - start)
+
+    def _add_header_size(self, size: int):
+        self._header_size += size
+        if self._header_size > MAX_HEADER_SIZE:
+            raise ValueError(f"multipart 头部超过大小限制: {MAX_HEADER_SIZE} 字节")
+
+    def _on_header_end(self):
+        if self._header_field.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        name = options.get(b"name")
+        if name is None:
+            raise ValueError("multipart 字段缺少 name")
+        self._part_name = name.decode("utf-8")
+        if self._part_name == self._file_field:
+            self._part_is_file = True
+            self._pending.append(("file_start", b""))
+        else:
+            self._field_count += 1
+            if self._field_count > MAX_FIELDS:
+                raise ValueError(f"表单字段数量超过限制: {MAX_FIELDS}")
@@ -14,5 +14,6 @@ echo "安装依赖..."
 pip install -r requirements.txt
 
 # 启动应用
-echo "启动Flask应用..."
-python src/app.py
+echo "启动FastAPI应用..."
+# 默认允许 demo（http://localhost:3001）跨域访问，可通过 ALLOWED_ORIGINS 指定其他域名
+ENABLE_CORS=${ENABLE_CORS:-1} python main.py
@@ -0,0 +1,100 @@
+"""
+Shared fixtures for the BigUpload FastAPI tests
+
+从源码目录运行（无需先 pip install -e .）：cd packages/backend/python && python -m pytest -q
+"""
+
+import hashlib
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from bigupload_fastapi import create_upload_router  # noqa: E402
+
+STORES = ("memory", "log", "sqlite", "redis")
+CHUNK_SIZE = 1024
+
+
+def make_store(name: str, tmp_path):
+    """按名称创建元数据存储；redis 使用 fakeredis（未安装时跳过）"""
+    from bigupload_fastapi import store
+
+    if name == "memory":
+        return store.MemoryMetadataStore()
+    if name == "log":
+        return store.LogMetadataStore(str(tmp_path / "log"))
+    if name == "sqlite":
+        return store.SQLiteMetadataStore(str(tmp_path / "metadata.db"))
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    return store.RedisMetadataStore(client=fakeredis.FakeAsyncRedis())
+
+
+@pytest.fixture(params=STORES)
+def store_name(request):
+    return request.param
+
+
+@pytest.fixture
+def make_client(tmp_path):
+    """返回 factory(store=None, **config) -> TestClient，路由挂载在 /upload 下并已执行启动事件"""
+    clients = []
+
+    def factory(store=None, enter=True, **config):
+        config.setdefault("upload_path", str(tmp_path / "uploads"))
+        app = FastAPI()
+        app.include_router(create_upload_router(metadata_store=store, **config), prefix="/upload")
+        client = TestClient(app)
+        if enter:
+            client.__enter__()
+            clients.append(client)
+        return client
+
+    yield factory
+    for client in clients:
+        client.__exit__(None, None, None)
+
+
+def split_chunks(data: bytes, chunk_size: int = CHUNK_SIZE):
+    return [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+
+
+def file_hash(data: bytes, hash_mode: str = "full", chunk_size: int = CHUNK_SIZE) -> str:
+    """客户端计算的 fileHash：full 为整个文件的 SHA-256，merkle 为各分片摘要组合后的哈希"""
+    if hash_mode == "merkle":
+        from bigupload_fastapi.hashing import merkle_root
+
+        return merkle_root((hashlib.sha256(c).digest() for c in split_chunks(data, chunk_size)), "sha256")
+    return hashlib.sha256(data).hexdigest()
+
+
+def upload_form(client, file_id, data, index, total, fhash, direct=False, **fields):
+    """以 multipart 表单上传一个分片（字段在前、分片在后）"""
+    form = {
+        "fileId": file_id,
+        "fileName": "data.bin",
+        "chunkIndex": str(index),
+        "chunkTotal": str(total),
+        "fileHash": fhash,
+        **fields,
+    }
+    if direct:
+        form.update(fileSize=str(len(data)), chunkSize=str(CHUNK_SIZE))
+    chunk = split_chunks(data)[index] if 0 <= index < total else b"x"
+    return client.post("/upload/upload", data=form, files={"chunk": ("blob", chunk)})
+
+
+def merge(client, file_id, data, fhash, total=None, **fields):
+    return client.post("/upload/merge", json={
+        "fileId": file_id,
+        "fileName": "data.bin",
+        "fileHash": fhash,
+        "chunkTotal": total if total is not None else len(split_chunks(data)),
+        **fields,
+    })
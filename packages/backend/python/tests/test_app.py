@@ -0,0 +1,52 @@
+"""
+示例应用 main.py
+"""
+
+import importlib.util
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+
+@pytest.fixture
+def load_app(tmp_path, monkeypatch):
+    """在临时目录中加载 main.create_app()，相对路径的上传目录与数据库都落在该目录下"""
+    monkeypatch.chdir(tmp_path)
+
+    def factory(**env):
+        for key, value in env.items():
+            monkeypatch.setenv(key, value)
+        spec = importlib.util.spec_from_file_location("bigupload_main", MAIN)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module.create_app()
+
+    return factory
+
+
+def test_cors_preflight_allows_upload_headers(load_app):
+    with TestClient(load_app(ENABLE_CORS="1")) as client:
+        r = client.options("/api/upload/upload/f1/0", headers={
+            "Origin": "http://localhost:3001",
+            "Access-Control-Request-Method": "PUT",
+            "Access-Control-Request-Headers": "x-chunk-total, x-file-hash, x-hash-algorithm",
+        })
+    assert r.status_code == 200
+    assert "x-hash-algorithm" in r.headers["access-control-allow-headers"].lower()
+
+
+def test_file_server_hides_metadata_and_partial_files(load_app, tmp_path):
+    """元数据库不在上传目录下，未完成的预分配文件也不能下载"""
+    with TestClient(load_app()) as client:
+        r = client.post("/api/upload/upload", data={
+            "fileId": "f1", "fileName": "a.bin", "chunkIndex": "0", "chunkTotal": "2",
+            "fileHash": "h", "fileSize": "20", "chunkSize": "10",
+        }, files={"chunk": ("blob", b"x" * 10)})
+        assert r.status_code == 200, r.text
+        assert (tmp_path / "uploads" / ".f1.partial").exists()
+        assert (tmp_path / "data" / "metadata.db").exists()
+        for name in ("metadata.db", ".f1.partial", "temp", "missing.bin"):
+            assert client.get(f"/api/upload/files/{name}").status_code == 404
@@ -0,0 +1,231 @@
+"""
+失败场景：过期分片摘要、合并期间重新上传、直接写入时合并与写入竞争、参数越界、未执行启动事件、关闭服务等
+"""
+
+import asyncio
+import hashlib
+import os
+
+import pytest
+
+from conftest import file_hash, make_store, merge, upload_form
+
+from bigupload_fastapi.config import UploadConfig
+from bigupload_fastapi.metadata import FileMetadata
+from bigupload_fastapi.models import MergeRequest
+from bigupload_fastapi.service import UploadService
+
+SIZE = 100
+DATA = os.urandom(3 * SIZE)
+CHUNKS = [DATA[i:i + SIZE] for i in range(0, len(DATA), SIZE)]
+
+
+async def body(data: bytes, gate: asyncio.Event = None, fail: bool = False):
+    """模拟请求体：先发送一小段，可在 gate 处等待或中途断开"""
+    yield data[:10]
+    if gate is not None:
+        await gate.wait()
+    if fail:
+        raise ConnectionError("client gone")
+    yield data[10:]
+
+
+async def make_service(tmp_path, store=None, **config):
+    service = UploadService(UploadConfig(upload_path=str(tmp_path / "uploads"), **config), store)
+    await service.init()
+    return service
+
+
+def upload_kwargs(fhash, file_id="f", direct=False):
+    kwargs = dict(file_id=file_id, file_name="x.bin", chunk_total=len(CHUNKS), file_hash=fhash)
+    if direct:
+        kwargs.update(file_size=len(DATA), chunk_size=SIZE)
+    return kwargs
+
+
+def merge_request(fhash, file_id="f"):
+    return MergeRequest(fileId=file_id, fileName="x.bin", fileHash=fhash, chunkTotal=len(CHUNKS))
+
+
+@pytest.mark.parametrize("index,total,extra", [
+    (0, 10 ** 12, {}),
+    (-1, 4, {}),
+    (4, 4, {}),
+    (0, 0, {}),
+    (0, 3, {"fileSize": "10", "chunkSize": "2"}),
+])
+def test_chunk_bounds(make_client, index, total, extra):
+    client = make_client()
+    r = client.post("/upload/upload", data={
+        "fileId": "b", "fileName": "a.bin", "chunkIndex": str(index),
+        "chunkTotal": str(total), "fileHash": "h", **extra,
+    }, files={"chunk": ("blob", b"xx")})
+    assert r.status_code == 400
+
+
+def test_chunk_total_must_match(make_client):
+    client = make_client()
+    data = os.urandom(4 * 1024)
+    assert upload_form(client, "b", data, 0, 4, "h").status_code == 200
+    assert upload_form(client, "b", data, 1, 5, "h").status_code == 400
+    assert merge(client, "b", data, "h", total=10 ** 9).status_code == 400
+
+
+@pytest.mark.parametrize("direct", [False, True], ids=["temp", "direct"])
+def test_without_startup_event(make_client, tmp_path, direct):
+    """未执行启动事件（每个请求运行在新的事件循环上）时上传与合并仍然可用"""
+    client = make_client(enter=False, temp_path=str(tmp_path / "temp" / "nested"))
+    data = os.urandom(3000)
+    fhash = hashlib.sha256(data).hexdigest()
+    for index in range(3):
+        assert upload_form(client, "n", data, index, 3, fhash, direct=direct).status_code == 200
+    assert merge(client, "n", data, fhash).status_code == 200
+    assert (tmp_path / "uploads" / f"{fhash}.bin").read_bytes() == data
+
+
+@pytest.mark.asyncio
+async def test_close_shuts_down_executor(tmp_path):
+    """合并时并行计算分片摘要的线程池在 close() 时关闭，之后再次合并会重新创建"""
+    service = await make_service(tmp_path)
+    for file_id in ("f", "g"):
+        data = os.urandom(len(DATA))
+        fhash = file_hash(data, "merkle", SIZE)
+        for index in range(len(CHUNKS)):
+            chunk = data[index * SIZE:(index + 1) * SIZE]
+            await service.upload_chunk(body(chunk), chunk_index=index, **upload_kwargs(fhash, file_id))
+        request = merge_request(fhash, file_id)
+        request.hashMode = "merkle"
+        await service.merge_chunks(request)
+        assert service._hash_executor is not None
+
+        await service.close()
+        assert service._hash_executor is None and not service._partial_writers
+
+
+@pytest.mark.asyncio
+async def test_direct_merge_and_late_chunk_across_workers(tmp_path):
+    """两个进程共享 SQLite 元数据：写入进行中时合并返回错误，合并后到达的分片被拒绝"""
+    from bigupload_fastapi.store import SQLiteMetadataStore
+
+    db = str(tmp_path / "metadata.db")
+    worker_a = await make_service(tmp_path, SQLiteMetadataStore(db))
+    worker_b = await make_service(tmp_path, SQLiteMetadataStore(db))
+    fhash = file_hash(DATA)
+    kwargs = upload_kwargs(fhash, direct=True)
+    for index in range(2):
+        await worker_b.upload_chunk(body(CHUNKS[index]), chunk_index=index, **kwargs)
+
+    gate = asyncio.Event()
+    task = asyncio.create_task(worker_b.upload_chunk(body(CHUNKS[2], gate), chunk_index=2, **kwargs))
+    await asyncio.sleep(0.05)
+    with pytest.raises(ValueError, match="正在写入"):
+        await worker_a.merge_chunks(merge_request(fhash))
+    gate.set()
+    await task
+
+    await worker_a.merge_chunks(merge_request(fhash))
+    target = tmp_path / "uploads" / f"{fhash}.bin"
+    assert target.read_bytes() == DATA
+
+    # worker_b 仍持有合并前的元数据
+    stale = FileMetadata(file_id="f", file_name="x.bin", file_hash=fhash, chunk_total=len(CHUNKS),
+                         file_size=len(DATA), chunk_size=SIZE)
+    with pytest.raises(ValueError):
+        await worker_b._write_partial_chunk(body(b"z" * SIZE), stale, 0, None)
+    with pytest.raises(ValueError):
+        await worker_b.upload_chunk(body(b"z" * SIZE), chunk_index=0, **kwargs)
+    assert target.read_bytes() == DATA
+    assert not worker_b._partial_writers
+    await worker_a.close()
+    await worker_b.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("direct", [False, True], ids=["temp", "direct"])
+async def test_failed_reupload_invalidates_chunk(tmp_path, store_name, direct):
+    """重新上传失败的分片不再计入已上传，合并不会使用旧摘要发布损坏的文件"""
+    service = await make_service(tmp_path, make_store(store_name, tmp_path), hash_mode="merkle")
+    fhash = file_hash(DATA, "merkle", SIZE)
+    kwargs = upload_kwargs(fhash, direct=direct)
+    for index, chunk in enumerate(CHUNKS):
+        await service.upload_chunk(body(chunk), chunk_index=index, **kwargs)
+
+    with pytest.raises(ValueError):
+        await service.upload_chunk(body(b"z" * SIZE), chunk_index=0, chunk_hash="00" * 32, **kwargs)
+    with pytest.raises(ValueError, match="分片不完整"):
+        await service.merge_chunks(merge_request(fhash))
+
+    await service.upload_chunk(body(CHUNKS[0]), chunk_index=0, **kwargs)
+    with pytest.raises(ConnectionError):
+        await service.upload_chunk(body(b"z" * SIZE, fail=True), chunk_index=1, **kwargs)
+    with pytest.raises(ValueError, match="分片不完整"):
+        await service.merge_chunks(merge_request(fhash))
+
+    await service.upload_chunk(body(CHUNKS[1]), chunk_index=1, **kwargs)
+    await service.merge_chunks(merge_request(fhash))
+    assert (tmp_path / "uploads" / f"{fhash}.bin").read_bytes() == DATA
+    await service.close()
+
+
+@pytest.mark.asyncio
+async def test_reupload_during_merge_rejected(tmp_path):
+    """临时分片 merkle 模式下，合并期间被重新上传的分片会使本次合并失败"""
+    service = await make_service(tmp_path, hash_mode="merkle")
+    fhash = file_hash(DATA, "merkle", SIZE)
+    kwargs = upload_kwargs(fhash)
+    for index, chunk in enumerate(CHUNKS):
+        await service.upload_chunk(body(chunk), chunk_index=index, **kwargs)
+
+    merge_chunk_files = service._merge_chunk_files
+
+    async def racing(*args, **kw):
+        await service.upload_chunk(body(b"z" * SIZE), chunk_index=1, **kwargs)
+        return await merge_chunk_files(*args, **kw)
+
+    service._merge_chunk_files = racing
+    with pytest.raises(ValueError, match="重新上传"):
+        await service.merge_chunks(merge_request(fhash))
+    assert not (tmp_path / "uploads" / f"{fhash}.bin").exists()
+
+    service._merge_chunk_files = merge_chunk_files
+    await service.upload_chunk(body(CHUNKS[1]), chunk_index=1, **kwargs)
+    await service.merge_chunks(merge_request(fhash))
+    assert (tmp_path / "uploads" / f"{fhash}.bin").read_bytes() == DATA
+    await service.close()
+
+
+@pytest.mark.parametrize("config,extra", [
+    ({"max_file_size": 1000}, {"fileSize": "3000", "chunkSize": "1024"}),
+    ({"max_direct_file_size": 1000}, {"fileSize": "3000", "chunkSize": "1024"}),
+    ({"chunk_size": 512}, {"fileSize": "3000", "chunkSize": "1024"}),
+], ids=["max_file_size", "max_direct_file_size", "chunk_size"])
+def test_direct_size_limits(make_client, tmp_path, config, extra):
+    """直接写入模式按声明的 fileSize 预分配，超过限制时不创建文件"""
+    client = make_client(**config)
+    r = client.post("/upload/upload", data={
+        "fileId": "b", "fileName": "a.bin", "chunkIndex": "0",
+        "chunkTotal": "3", "fileHash": "h", **extra,
+    }, files={"chunk": ("blob", b"xx")})
+    assert r.status_code == 400
+    assert not (tmp_path / "uploads" / ".b.partial").exists()
+    assert client.get("/upload/status/b").status_code == 404
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("direct", [False, True], ids=["temp", "direct"])
+async def test_failed_first_chunk_discards_upload(tmp_path, store_name, direct):
+    """首个分片失败时删除本次创建的元数据与预分配文件，已有分片的上传则保留"""
+    service = await make_service(tmp_path, make_store(store_name, tmp_path))
+    fhash = file_hash(DATA)
+    kwargs = upload_kwargs(fhash, direct=direct)
+    with pytest.raises(ConnectionError):
+        await service.upload_chunk(body(CHUNKS[0], fail=True), chunk_index=0, **kwargs)
+    assert await service.get_file_metadata("f") is None
+    assert not (tmp_path / "uploads" / ".f.partial").exists()
+    assert not os.path.exists(service.config.get_temp_dir_path("f"))
+
+    await service.upload_chunk(body(CHUNKS[0]), chunk_index=0, **kwargs)
+    with pytest.raises(ConnectionError):
+        await service.upload_chunk(body(CHUNKS[1], fail=True), chunk_index=1, **kwargs)
+    assert await service.get_file_metadata("f") is not None
+    await service.close()
@@ -0,0 +1,101 @@
+"""
+分片拼接：内核拷贝与 O_DIRECT 写入
+"""
+
+import hashlib
+import os
+
+import pytest
+
+from bigupload_fastapi import fileops
+
+
+def write_parts(tmp_path, sizes):
+    paths, data = [], b""
+    for i, size in enumerate(sizes):
+        chunk = os.urandom(size)
+        path = tmp_path / f"part{i}"
+        path.write_bytes(chunk)
+        paths.append(str(path))
+        data += chunk
+    return paths, data
+
+
+@pytest.mark.parametrize("direct", [False, True], ids=["buffered", "o_direct"])
+def test_concat_files(tmp_path, monkeypatch, direct):
+    if direct:
+        if not fileops.HAS_O_DIRECT:
+            pytest.skip("O_DIRECT not supported")
+        # 可用内存很小时，合并后的文件超过一半，改用 O_DIRECT 写入
+        monkeypatch.setattr(fileops, "available_memory", lambda: 1024)
+        monkeypatch.setattr(fileops, "COPY_BUFFER_SIZE", 64 * 1024)
+    # 跨过缓冲区边界并以不足一个对齐块的尾部结束
+    paths, data = write_parts(tmp_path, [40 * 1024, 50 * 1024, 4097])
+    target = str(tmp_path / "merged")
+    hasher = hashlib.sha256()
+
+    fileops.concat_files(target, paths, hasher)
+
+    with open(target, "rb") as f:
+        assert f.read() == data
+    assert hasher.hexdigest() == hashlib.sha256(data).hexdigest()
+
+
+def test_concat_files_without_kernel_copy(tmp_path, monkeypatch):
+    """内核拷贝不可用时回退为缓冲区读写"""
+    monkeypatch.setattr(fileops, "kernel_copy", lambda out_fd, in_fd, offset, size: offset)
+    paths, data = write_parts(tmp_path, [3000, 5000])
+    target = str(tmp_path / "merged")
+
+    fileops.concat_files(target, paths)
+
+    with open(target, "rb") as f:
+        assert f.read() == data
+
+
+
+def test_concat_files_short_writes(tmp_path, monkeypatch):
+    """回退的缓冲区写入只写入一部分时继续写完剩余数据"""
+    monkeypatch.setattr(fileops, "kernel_copy", lambda out_fd, in_fd, offset, size: offset)
+    write = os.write
+    monkeypatch.setattr(os, "write", lambda fd, data: write(fd, data[:1000]))
+    paths, data = write_parts(tmp_path, [3000, 5000])
+    target = str(tmp_path / "merged")
+
+    fileops.concat_files(target, paths)
+
+    with open(target, "rb") as f:
+        assert f.read() == data
+
+def test_concat_direct_unsupported_falls_back(tmp_path, monkeypatch):
+    """文件系统不支持 O_DIRECT 时回退为普通拼接"""
+    if not fileops.HAS_O_DIRECT:
+        pytest.skip("O_DIRECT not supported")
+    monkeypatch.setattr(fileops, "available_memory", lambda: 1024)
+    monkeypatch.setattr(fileops, "_concat_files_direct", lambda *args: False)
+    paths, data = write_parts(tmp_path, [3000, 5000])
+    target = str(tmp_path / "merged")
+
+    fileops.concat_files(target, paths)
+
+    with open(target, "rb") as f:
+        assert f.read() == data
+
+
+def test_try_lock(tmp_path):
+    path = str(tmp_path / "lock")
+    open(path, "wb").close()
+    shared = os.open(path, os.O_RDONLY)
+    other = os.open(path, os.O_RDONLY)
+    try:
+        assert fileops.try_lock(shared, exclusive=False)
+        assert fileops.try_lock(other, exclusive=False)
+        if fileops.fcntl is not None:
+            exclusive = os.open(path, os.O_RDONLY)
+            try:
+                assert not fileops.try_lock(exclusive, exclusive=True)
+            finally:
+                os.close(exclusive)
+    finally:
+        os.close(shared)
+        os.close(other)
@@ -0,0 +1,28 @@
+"""
+文件哈希：BLAKE3 的线程数
+"""
+
+import pytest
+
+from bigupload_fastapi import hashing
+
+blake3 = pytest.importorskip("blake3")
+
+
+def test_blake3_threads(tmp_path, monkeypatch):
+    """整个文件的哈希使用 BLAKE3 多线程，线程池中并行计算的分片摘要使用单线程"""
+    path = tmp_path / "data"
+    path.write_bytes(b"x" * 4096)
+    threads = []
+    real = blake3.blake3
+
+    def recording(*args, max_threads=1, **kwargs):
+        threads.append(max_threads)
+        return real(*args, max_threads=max_threads, **kwargs)
+
+    recording.AUTO = real.AUTO
+    monkeypatch.setattr(blake3, "blake3", recording)
+    expected = real(b"x" * 4096)
+    assert hashing.hash_file(str(path), "blake3") == expected.hexdigest()
+    assert hashing.hash_file_digest(str(path), "blake3") == expected.digest()
+    assert threads == [real.AUTO, 1]
@@ -0,0 +1,54 @@
+"""
+分片位图
+"""
+
+import base64
+
+import pytest
+
+from bigupload_fastapi.metadata import ChunkBitmap
+
+
+def test_add_and_query():
+    bitmap = ChunkBitmap(20)
+    for index in (0, 9, 19, 9):
+        bitmap.add(index)
+    assert len(bitmap) == 3
+    assert 9 in bitmap and 1 not in bitmap and 1000 not in bitmap
+    assert list(bitmap) == [0, 9, 19]
+
+
+def test_grows_past_chunk_total():
+    bitmap = ChunkBitmap(4)
+    bitmap.add(30)
+    assert list(bitmap) == [30]
+
+
+def test_first_missing():
+    bitmap = ChunkBitmap(17)
+    for index in range(17):
+        if index != 12:
+            bitmap.add(index)
+    assert bitmap.first_missing(17) == 12
+    bitmap.add(12)
+    assert bitmap.first_missing(17) is None
+
+
+@pytest.mark.parametrize("chunk_total", [1, 8, 13, 64])
+def test_all_set(chunk_total):
+    bitmap = ChunkBitmap(chunk_total)
+    for index in range(chunk_total - 1):
+        bitmap.add(index)
+    assert not bitmap.all_set(chunk_total)
+    bitmap.add(chunk_total - 1)
+    assert bitmap.all_set(chunk_total)
+    assert not bitmap.all_set(chunk_total + 1)
+
+
+def test_round_trip():
+    bitmap = ChunkBitmap(12)
+    bitmap.add(3)
+    bitmap.add(11)
+    restored = ChunkBitmap(data=bitmap.to_bytes())
+    assert list(restored) == [3, 11] and len(restored) == 2
+    assert base64.b64decode(bitmap.to_base64()) == bitmap.to_bytes()
@@ -0,0 +1,102 @@
+"""
+元数据存储
+"""
+
+import pytest
+
+from conftest import make_store
+
+from bigupload_fastapi.metadata import FileMetadata
+from bigupload_fastapi.store import LogMetadataStore
+
+pytestmark = pytest.mark.asyncio
+
+
+def new_metadata(file_id="f", file_hash="h", chunk_total=4):
+    return FileMetadata(file_id=file_id, file_name="x.bin", file_hash=file_hash, chunk_total=chunk_total)
+
+
+async def test_round_trip(tmp_path, store_name):
+    store = make_store(store_name, tmp_path)
+    await store.init()
+    await store.create(new_metadata())
+    await store.add_chunk("f", 0)
+    metadata = await store.add_chunk("f", 3)
+    assert sorted(metadata.uploaded_chunks) == [0, 3]
+
+    assert sorted((await store.get("f")).uploaded_chunks) == [0, 3]
+    assert (await store.find_by_hash("h")).file_id == "f"
+    assert [m.file_id for m in await store.list()] == ["f"]
+
+    await store.delete("f")
+    assert await store.get("f") is None
+    assert await store.find_by_hash("h") is None
+
+
+async def test_log_store_recovers_after_restart(tmp_path):
+    log_dir = str(tmp_path / "log")
+    store = LogMetadataStore(log_dir)
+    await store.init()
+    await store.create(new_metadata("f"))
+    await store.create(new_metadata("g", "h2"))
+    await store.add_chunk("f", 0)
+    await store.add_chunk("f", 2)
+    await store.delete("g")
+
+    restarted = LogMetadataStore(log_dir)
+    await restarted.init()
+    assert sorted((await restarted.get("f")).uploaded_chunks) == [0, 2]
+    assert await restarted.get("g") is None
+
+    # 恢复后继续追加
+    await restarted.add_chunk("f", 1)
+    again = LogMetadataStore(log_dir)
+    await again.init()
+    assert sorted((await again.get("f")).uploaded_chunks) == [0, 1, 2]
+
+
+
+async def test_log_store_truncates_torn_line(tmp_path):
+    """崩溃时写了一半的最后一行被截断，之后追加的记录不会与其拼在一起"""
+    log_dir = tmp_path / "log"
+    store = LogMetadataStore(str(log_dir))
+    await store.init()
+    await store.create(new_metadata("f", chunk_total=20))
+    await store.add_chunk("f", 0, b"\x01" * 32)
+    with open(log_dir / "f.log", "ab") as f:
+        f.write(b"1 0202")
+
+    restarted = LogMetadataStore(str(log_dir))
+    await restarted.init()
+    await restarted.add_chunk("f", 15)
+    again = LogMetadataStore(str(log_dir))
+    await again.init()
+    metadata = await again.get("f")
+    assert sorted(metadata.uploaded_chunks) == [0, 15]
+    assert metadata.chunk_digests == {0: b"\x01" * 32}
+
+
+async def test_log_store_skips_corrupt_log(tmp_path):
+    """无法解析的日志不影响启动，移到一旁后继续恢复其他上传"""
+    log_dir = tmp_path / "log"
+    store = LogMetadataStore(str(log_dir))
+    await store.init()
+    await store.create(new_metadata("f"))
+    await store.add_chunk("f", 1)
+    (log_dir / "bad.log").write_bytes(b"not json\n")
+    (log_dir / "glued.log").write_bytes((log_dir / "f.log").read_bytes().replace(b'"f"', b'"glued"') + b"1 zz\n")
+
+    restarted = LogMetadataStore(str(log_dir))
+    await restarted.init()
+    assert sorted((await restarted.get("f")).uploaded_chunks) == [1]
+    assert await restarted.get("glued") is None
+    assert sorted(p.name for p in log_dir.iterdir()) == ["bad.log.corrupt", "f.log", "glued.log.corrupt"]
+
+async def test_find_by_hash_returns_earliest(tmp_path, store_name):
+    store = make_store(store_name, tmp_path)
+    await store.init()
+    for file_id in ("z3", "a1", "m2"):
+        await store.create(new_metadata(file_id, "H"))
+    assert [(await store.find_by_hash("H")).file_id for _ in range(3)] == ["z3"] * 3
+    await store.delete("z3")
+    assert (await store.find_by_hash("H")).file_id == "a1"
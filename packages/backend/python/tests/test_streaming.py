@@ -0,0 +1,119 @@
+"""
+流式 multipart 解析与请求体分块
+"""
+
+import pytest
+
+from bigupload_fastapi.streaming import (
+    MAX_FIELDS,
+    MAX_FIELD_SIZE,
+    MAX_HEADER_SIZE,
+    MultipartChunkReader,
+    coalesce_stream,
+    limit_stream,
+)
+
+pytestmark = pytest.mark.asyncio
+
+
+class FakeRequest:
+    """按 read_size 分块产出请求体的最小 Request 替身"""
+
+    def __init__(self, body: bytes, read_size: int = 4096):
+        self.headers = {"content-type": "multipart/form-data; boundary=XX"}
+        self._body = body
+        self._read_size = read_size
+
+    async def stream(self):
+        for i in range(0, len(self._body), self._read_size):
+            yield self._body[i:i + self._read_size]
+
+
+def part(name: str, value: bytes, file: bool = False) -> bytes:
+    filename = '; filename="blob"' if file else ""
+    return f'--XX\r\nContent-Disposition: form-data; name="{name}"{filename}\r\n\r\n'.encode() + value + b"\r\n"
+
+
+def form(*parts: bytes) -> bytes:
+    return b"".join(parts) + b"--XX--\r\n"
+
+
+async def read_form(body: bytes, read_size: int = 4096):
+    reader = MultipartChunkReader(FakeRequest(body, read_size))
+    data = b""
+    if await reader.read_until_file():
+        data = b"".join([chunk async for chunk in reader.iter_file()])
+    await reader.read_remaining()
+    return reader.fields, data
+
+
+@pytest.mark.parametrize("read_size", [1, 7, 4096])
+async def test_fields_then_file(read_size):
+    payload = bytes(range(256)) * 40
+    fields, data = await read_form(form(part("fileId", b"f1"), part("chunkIndex", b"3"),
+                                        part("chunk", payload, file=True)), read_size)
+    assert fields == {"fileId": "f1", "chunkIndex": "3"}
+    assert data == payload
+
+
+async def test_field_after_file_rejected():
+    with pytest.raises(ValueError, match="chunkHash"):
+        await read_form(form(part("fileId", b"f1"), part("chunk", b"d", file=True), part("chunkHash", b"x")))
+
+
+async def test_spool_file_reads_trailing_fields():
+    """分片先于字段到达时暂存分片，读完全部字段后再产出"""
+    reader = MultipartChunkReader(FakeRequest(form(part("chunk", b"data", file=True), part("chunkHash", b"x"))))
+    assert await reader.read_until_file()
+    assert reader.fields == {}
+    spooled = await reader.spool_file()
+    assert reader.fields == {"chunkHash": "x"}
+    assert b"".join([chunk async for chunk in spooled]) == b"data"
+
+
+async def test_field_size_limit():
+    with pytest.raises(ValueError, match="大小限制"):
+        await read_form(form(part("a", b"x" * (MAX_FIELD_SIZE + 1)), part("chunk", b"d", file=True)))
+
+
+async def test_field_count_limit():
+    fields, _ = await read_form(form(*(part(f"f{i}", b"1") for i in range(MAX_FIELDS)), part("chunk", b"d", file=True)))
+    assert len(fields) == MAX_FIELDS
+    with pytest.raises(ValueError, match="数量"):
+        await read_form(form(*(part(f"f{i}", b"1") for i in range(MAX_FIELDS + 1))))
+
+
+async def test_header_size_limit():
+    # 每行不超过 python-multipart 的单行限制，合计超过 MAX_HEADER_SIZE
+    padding = b"".join(b"X-Pad-%d: " % i + b"p" * 4000 + b"\r\n" for i in range(MAX_HEADER_SIZE // 4000 + 1))
+    header = b"--XX\r\nContent-Disposition: form-data; name=\"a\"\r\n" + padding + b"\r\n1\r\n"
+    with pytest.raises(ValueError, match="头部"):
+        await read_form(header + b"--XX--\r\n", read_size=1024)
+
+
+async def test_file_size_limit():
+    reader = MultipartChunkReader(FakeRequest(form(part("chunk", b"x" * 100, file=True))), max_size=10)
+    assert await reader.read_until_file()
+    with pytest.raises(ValueError):
+        async for _ in reader.iter_file():
+            pass
+
+
+async def aiter(blocks):
+    for block in blocks:
+        yield block
+
+
+async def test_coalesce_stream():
+    blocks = [b"a" * 3, b"b" * 3, b"c" * 3, b"d" * 10, b"e"]
+    out = [block async for block in coalesce_stream(aiter(blocks), block_size=5)]
+    assert b"".join(out) == b"".join(blocks)
+    assert all(isinstance(block, bytes) for block in out)
+    assert all(len(block) >= 5 for block in out[:-1])
+
+
+async def test_limit_stream():
+    assert [b async for b in limit_stream(aiter([b"ab", b"", b"cd"]), 4)] == [b"ab", b"cd"]
+    with pytest.raises(ValueError):
+        async for _ in limit_stream(aiter([b"ab", b"cde"]), 4):
+            pass
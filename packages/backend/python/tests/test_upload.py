@@ -0,0 +1,128 @@
+"""
+断点续传与合并：各元数据存储 × 哈希模式 × 临时分片/直接写入
+"""
+
+import base64
+import hashlib
+import os
+
+import pytest
+
+from conftest import file_hash, make_store, merge, split_chunks, upload_form
+
+DATA = os.urandom(3000)  # 1024 + 1024 + 952，最后一个分片不足 chunkSize
+
+
+@pytest.mark.parametrize("direct", [False, True], ids=["temp", "direct"])
+@pytest.mark.parametrize("hash_mode", ["full", "merkle"])
+def test_resume_and_merge(make_client, tmp_path, store_name, hash_mode, direct):
+    client = make_client(make_store(store_name, tmp_path), hash_mode=hash_mode)
+    fhash = file_hash(DATA, hash_mode)
+    chunks = split_chunks(DATA)
+    total = len(chunks)
+
+    r = client.post("/upload/verify", json={"fileId": "f1", "fileName": "data.bin", "fileHash": fhash})
+    assert r.status_code == 200
+    assert not r.json()["exists"] and r.json()["hashMode"] == hash_mode
+
+    # 先上传一部分（倒序到达），模拟中断
+    for index in (2, 0):
+        r = upload_form(client, "f1", DATA, index, total, fhash, direct=direct,
+                        chunkHash=hashlib.sha256(chunks[index]).hexdigest())
+        assert r.status_code == 200, r.text
+
+    # 续传：同一 fileHash 换一个 fileId 查询，拿到已上传的分片
+    r = client.post("/upload/verify", json={"fileId": "f2", "fileName": "data.bin", "fileHash": fhash})
+    body = r.json()
+    assert body["fileId"] == "f1" and not body["finish"]
+    assert sorted(body["uploadedChunks"]) == [0, 2]
+    assert client.get("/upload/status/f1").status_code == 200
+
+    r = merge(client, "f1", DATA, fhash)
+    assert r.status_code == 400
+
+    r = upload_form(client, "f1", DATA, 1, total, fhash, direct=direct)
+    assert r.status_code == 200 and r.json()["uploadedCount"] == total
+
+    r = merge(client, "f1", DATA, fhash)
+    assert r.status_code == 200, r.text
+    assert r.json()["hashMode"] == hash_mode
+    target = tmp_path / "uploads" / f"{fhash}.bin"
+    assert target.read_bytes() == DATA
+    assert client.get(f"/upload/files/{fhash}.bin").content == DATA
+    assert [p.name for p in (tmp_path / "uploads").iterdir() if p.name.startswith(".")] == []
+
+    # 秒传
+    r = client.post("/upload/verify", json={"fileId": "f3", "fileName": "data.bin", "fileHash": fhash})
+    assert r.json()["exists"] and r.json()["finish"]
+    assert client.get("/upload/status/f1").status_code == 404
+
+
+@pytest.mark.parametrize("direct", [False, True], ids=["temp", "direct"])
+def test_merge_rejects_wrong_hash(make_client, store_name, tmp_path, direct):
+    client = make_client(make_store(store_name, tmp_path))
+    fhash = "ab" * 32
+    total = len(split_chunks(DATA))
+    for index in range(total):
+        assert upload_form(client, "f1", DATA, index, total, fhash, direct=direct).status_code == 200
+
+    r = merge(client, "f1", DATA, fhash)
+    assert r.status_code == 400
+    assert not (tmp_path / "uploads" / f"{fhash}.bin").exists()
+
+
+def test_merkle_requested_per_merge(make_client):
+    """服务端默认 full 时，合并请求可单独指定 merkle 模式"""
+    client = make_client()
+    fhash = file_hash(DATA, "merkle")
+    total = len(split_chunks(DATA))
+    for index in range(total):
+        assert upload_form(client, "f1", DATA, index, total, fhash).status_code == 200
+
+    r = merge(client, "f1", DATA, fhash, hashMode="merkle")
+    assert r.status_code == 200, r.text
+    assert r.json()["hashMode"] == "merkle"
+
+
+@pytest.mark.parametrize("direct", [False, True], ids=["temp", "direct"])
+def test_raw_put_upload(make_client, direct):
+    client = make_client()
+    fhash = file_hash(DATA)
+    chunks = split_chunks(DATA)
+    for index, chunk in enumerate(chunks):
+        headers = {
+            "X-Chunk-Total": str(len(chunks)),
+            "X-File-Hash": fhash,
+            "X-File-Name": "data.bin",
+            "X-Chunk-Hash": hashlib.sha256(chunk).hexdigest(),
+        }
+        if direct:
+            headers.update({"X-File-Size": str(len(DATA)), "X-Chunk-Size": str(len(chunks[0]))})
+        r = client.put(f"/upload/upload/f1/{index}", content=chunk, headers=headers)
+        assert r.status_code == 200, r.text
+
+    assert merge(client, "f1", DATA, fhash).status_code == 200
+
+
+def test_upload_response_format(make_client):
+    """默认只返回已上传数量，format=list / format=bitmap 时附带已上传分片"""
+    client = make_client()
+    fhash = file_hash(DATA)
+    chunks = split_chunks(DATA)
+    form = {"fileId": "f1", "fileName": "data.bin", "chunkTotal": "3", "fileHash": fhash}
+
+    r = client.post("/upload/upload", data={**form, "chunkIndex": "0"}, files={"chunk": ("blob", chunks[0])})
+    assert r.json()["uploadedCount"] == 1 and r.json().get("uploadedChunks") is None
+    r = client.post("/upload/upload?format=list", data={**form, "chunkIndex": "2"},
+                    files={"chunk": ("blob", chunks[2])})
+    assert r.json()["uploadedChunks"] == [0, 2]
+    r = client.post("/upload/upload?format=bitmap", data={**form, "chunkIndex": "1"},
+                    files={"chunk": ("blob", chunks[1])})
+    assert base64.b64decode(r.json()["uploadedBitmap"]) == b"\x07"
+
+
+def test_chunk_hash_mismatch(make_client):
+    client = make_client()
+    fhash = file_hash(DATA)
+    r = upload_form(client, "f1", DATA, 0, 3, fhash, chunkHash="00" * 32)
+    assert r.status_code == 400
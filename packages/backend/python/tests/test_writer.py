@@ -0,0 +1,55 @@
+"""
+直接写入模式的写入任务
+"""
+
+import asyncio
+import os
+
+import pytest
+
+import bigupload_fastapi.service as service_module
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_concurrent_writes_land_at_offsets(tmp_path):
+    """同一文件并发写入的分片由一个写入任务成批写入各自的偏移"""
+    path = str(tmp_path / "partial")
+    writer = service_module._PartialFileWriter(os.open(path, os.O_RDWR | os.O_CREAT))
+    blocks = [os.urandom(100) for _ in range(20)]
+    await asyncio.gather(*(writer.write(block, i * 100) for i, block in reversed(list(enumerate(blocks)))))
+    await writer.close()
+
+    with open(path, "rb") as f:
+        assert f.read() == b"".join(blocks)
+
+
+async def test_failure_fails_fast(tmp_path, monkeypatch):
+    """写入任务退出后，排队中与之后的写入立即失败而不是一直等待"""
+    fd = os.open(str(tmp_path / "partial"), os.O_RDWR | os.O_CREAT)
+    writer = service_module._PartialFileWriter(fd)
+    await writer.write(b"ab", 0)
+
+    def broken(fd, items):
+        raise ZeroDivisionError
+
+    monkeypatch.setattr(service_module, "_pwrite_batch", broken)
+    results = await asyncio.wait_for(
+        asyncio.gather(writer.write(b"x", 0), writer.write(b"y", 1), return_exceptions=True), 2)
+    assert all(isinstance(r, Exception) for r in results)
+    assert writer.stopped
+    with pytest.raises(OSError):
+        await asyncio.wait_for(writer.write(b"z", 2), 2)
+    await writer.close()
+
+
+async def test_cancelled_task_fails_pending_writes(tmp_path):
+    fd = os.open(str(tmp_path / "partial"), os.O_RDWR | os.O_CREAT)
+    writer = service_module._PartialFileWriter(fd)
+    await asyncio.sleep(0)
+    pending = asyncio.ensure_future(writer.write(b"q", 0))
+    await asyncio.sleep(0)
+    writer._task.cancel()
+    (result,) = await asyncio.wait_for(asyncio.gather(pending, return_exceptions=True), 2)
+    assert isinstance(result, OSError)
+    await writer.close()
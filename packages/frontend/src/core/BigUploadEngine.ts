@@ -28,6 +28,11 @@ export interface UploadConfig {
   };
   /** 是否启用硬件感知并发控制 */
   useHardwareConcurrency?: boolean;
+  /**
+   * 是否使用 PUT 原始请求体上传分片（`PUT {upload}/{fileId}/{chunkIndex}`），
+   * 省去 multipart 解析，需后端支持（如 Python 后端），默认 false
+   */
+  rawChunkUpload?: boolean;
 }
 
 export interface FileUploadState {
@@ -129,6 +134,7 @@ export class BigUploadEngine {
         merge: "/merge-chunks",
       },
       useHardwareConcurrency: true,
+      rawChunkUpload: false,
       ...config,
     };
 
@@ -502,14 +508,24 @@ export class BigUploadEngine {
     const end = Math.min(start + this.config.chunkSize, file.size);
     const chunk = file.slice(start, end);
 
-    const formData = new FormData();
-    formData.append("chunk", chunk);
-    formData.append("fileId", fileId);
-    formData.append("fileName", file.name);
-    formData.append("filename", file.name); // Python后端兼容
-    formData.append("chunkIndex", chunkIndex.toString());
-    formData.append("chunkTotal", fileState.progress.totalChunks.toString());
-    formData.append("fileHash", fileHash!);
+    const uploadRequest: RequestInit = this.config.rawChunkUpload
+      ? {
+          method: "PUT",
+          headers: {
+            "Content-Type": "application/octet-stream",
+            "X-Chunk-Total": fileState.progress.totalChunks.toString(),
+            "X-File-Hash": fileHash!,
+            "X-File-Name": encodeURIComponent(file.name),
+          },
+          body: chunk,
+        }
+      : {
+          method: "POST",
+          body: this.createChunkFormData(fileId, chunkIndex, chunk),
+        };
+    const uploadPath = this.config.rawChunkUpload
+      ? `${this.config.apiPaths.upload}/${encodeURIComponent(fileId)}/${chunkIndex}`
+      : this.config.apiPaths.upload;
 
     const abortController = new AbortController();
     this.abortControllers.set(`${fileId}_${chunkIndex}`, abortController);
@@ -535,9 +551,8 @@ export class BigUploadEngine {
           progress: { ...fileState.progress, currentChunk: chunkIndex },
         });
 
-        await this.request(this.config.apiPaths.upload, {
-          method: "POST",
-          body: formData,
+        await this.request(uploadPath, {
+          ...uploadRequest,
           signal: abortController.signal,
         });
 
@@ -594,6 +609,28 @@ export class BigUploadEngine {
     throw lastError;
   }
 
+  /**
+   * 构建 multipart 分片上传表单
+   */
+  private createChunkFormData(
+    fileId: string,
+    chunkIndex: number,
+    chunk: Blob
+  ): FormData {
+    const { file, fileHash, progress } = this.files.get(fileId)!;
+
+    const formData = new FormData();
+    formData.append("fileId", fileId);
+    formData.append("fileName", file.name);
+    formData.append("filename", file.name); // Python后端兼容
+    formData.append("chunkIndex", chunkIndex.toString());
+    formData.append("chunkTotal", progress.totalChunks.toString());
+    formData.append("fileHash", fileHash!);
+    // 分片放在最后，服务端可在收到分片数据前解析完字段并直接流式写入
+    formData.append("chunk", chunk);
+    return formData;
+  }
+
   /**
    * 判断错误是否可重试 - 基于 Uppy 的错误分类策略
    */
@@ -122,12 +122,13 @@ export class RequestManager {
     onProgress?: (progressEvent: AxiosProgressEvent) => void
   ): Promise<T> {
     const formData = new FormData();
-    formData.append("chunk", chunk);
 
     // 添加其他参数
     Object.entries(params).forEach(([key, value]) => {
       formData.append(key, value.toString());
     });
+    // 分片放在最后，服务端可在收到分片数据前解析完字段并直接流式写入
+    formData.append("chunk", chunk);
 
     console.log(`准备上传分片到 ${url}，参数:`, params);
 